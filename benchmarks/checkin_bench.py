@@ -0,0 +1,91 @@
+"""Per-scan cost of the check-in/check-out lookup for a week of history against several years of it
+
+Run from the project root:  python -m benchmarks.checkin_bench [staff]
+
+Each staff member checks in and out every school day. The lookup finds the scan that decides whether the
+next one is a check-in or a check-out, first by walking staff.attendance as before, then through the
+store's (staff, day) index
+"""
+
+import sys
+import time
+
+from data.attendance_store import AttendanceStore
+from data.data_objects import AttendanceEntry, Staff
+from data.time_data_objects import Period, Time
+
+from benchmarks.store_bench import make_staff
+
+
+def make_history(staff: list[Staff], days: int):
+    entries = []
+    period = Period(Time(7, 0, 0), "Monday", 4, "January", 2021)
+    
+    for _ in range(days):
+        if period.day not in ("Saturday", "Sunday"):
+            for member in staff:
+                for hour, is_check_in in ((7, True), (14, False)):
+                    scan = period.copy()
+                    scan.time.hour = hour
+                    
+                    entry = AttendanceEntry(scan, member, is_check_in)
+                    member.attendance.append(entry)
+                    entries.append(entry)
+        
+        period = period.copy()
+        period.time.hour += 24
+        period.normalize()
+    
+    return entries
+
+
+def legacy_previous_check_in(staff: Staff, period: Period):
+    return next((entry.is_check_in for entry in staff.attendance if entry.period.date == period.date and entry.period.month == period.month and entry.period.year == period.year), None)
+
+def indexed_previous_check_in(store: AttendanceStore, staff: Staff, period: Period):
+    latest = store.latest_of_day(staff, period)
+    
+    return latest.is_check_in if latest is not None else None
+
+
+def bench(name: str, func, staff: list[Staff], period: Period, rounds: int = 20):
+    start = time.perf_counter()
+    
+    for _ in range(rounds):
+        for member in staff:
+            func(member, period)
+    
+    per_scan = (time.perf_counter() - start) / (rounds * len(staff))
+    
+    print(f"{name:>16}: {per_scan * 1_000_000:>10,.2f} us per scan")
+    
+    return per_scan
+
+
+def main(args: list[str]):
+    size = int(args[0]) if args else 50
+    
+    results = {}
+    
+    for label, days in (("week", 7), ("5 years", 5 * 365)):
+        staff = make_staff(size)
+        entries = make_history(staff, days)
+        store = AttendanceStore(entries)
+        
+        # Afternoon of the last school day, after that day's check-in and check-out
+        scan = entries[-1].period.copy()
+        scan.time.hour = 15
+        
+        # The walk stops at the day's first scan, the check-in, the index answers with its latest, the check-out
+        assert legacy_previous_check_in(staff[0], scan) is True and indexed_previous_check_in(store, staff[0], scan) is False
+        
+        legacy = bench(f"{label} legacy", legacy_previous_check_in, staff, scan)
+        indexed = bench(f"{label} indexed", lambda member, period: indexed_previous_check_in(store, member, period), staff, scan)
+        
+        results[label] = legacy, indexed
+    
+    print(f"5 years / week: legacy {results['5 years'][0] / results['week'][0]:.1f}x, indexed {results['5 years'][1] / results['week'][1]:.1f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,83 @@
+"""Opening, scanning into and querying a .cdb database against a pickled .cdat file
+
+Run from the project root:  python -m benchmarks.database_bench [entries] [directory]
+
+A report here is one staff member's scans over one year. From a .cdat file it needs the whole file loaded
+first, the database answers it from its (staff, epoch) index
+"""
+
+import os
+import sys
+import time
+import pickle
+import tempfile
+
+from data.data_objects import AttendanceEntry
+from data.database import AttendanceDatabase, import_cdat
+from data.journal import write_snapshot
+from data.time_data_objects import Period, Time
+
+from benchmarks.journal_bench import make_data
+from benchmarks.store_bench import make_entries
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    
+    return time.perf_counter() - start, result
+
+
+def cdat_report(path: str, start: Period, end: Period):
+    with open(path, "rb") as file:
+        data = pickle.load(file)
+    
+    staff = data.teachers["t_id0"]
+    
+    return sum(1 for entry in staff.attendance if start <= entry.period <= end)
+
+def database_report(path: str, start: Period, end: Period):
+    database = AttendanceDatabase(path)
+    
+    try:
+        teachers, prefects = database.roster()
+        
+        return database.count(start, end, teachers["t_id0"])
+    finally:
+        database.close()
+
+
+def main(args: list[str]):
+    size = int(args[0]) if len(args) > 0 else 200_000
+    directory = args[1] if len(args) > 1 else tempfile.mkdtemp()
+    
+    cdat_path = os.path.join(directory, "bench.cdat")
+    path = os.path.join(directory, "bench.cdb")
+    
+    data = make_data(size)
+    write_snapshot(cdat_path, data)
+    
+    print(f" import: {timed(lambda: import_cdat(cdat_path, path))[0] * 1000:>9,.1f} ms for {size:,} entries")
+    
+    start, end = Period(Time(0, 0, 0), "Friday", 1, "January", 2021), Period(Time(23, 59, 59), "Friday", 31, "December", 2021)
+    
+    cdat_time, cdat_count = timed(lambda: cdat_report(cdat_path, start, end))
+    database_time, database_count = timed(lambda: database_report(path, start, end))
+    
+    assert cdat_count == database_count, (cdat_count, database_count)
+    
+    print(f" report: .cdat {cdat_time * 1000:>9,.1f} ms   .cdb {database_time * 1000:>7,.1f} ms  ({database_count:,} scans)")
+    
+    database = AttendanceDatabase(path)
+    data.attach_journal(database)
+    
+    scans = make_entries(200, list(data.teachers.values()), seed=1)
+    scan_time, _ = timed(lambda: [data.add_attendance(AttendanceEntry(entry.period, entry.staff, entry.is_check_in), "Gate 1") for entry in scans])
+    
+    database.close()
+    
+    print(f"   scan: .cdb {scan_time / len(scans) * 1000:>7,.3f} ms per committed scan")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
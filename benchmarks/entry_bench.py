@@ -0,0 +1,82 @@
+"""Memory and attribute access of slotted attendance entries against the original __dict__ based ones
+
+Run from the project root:  python -m benchmarks.entry_bench [entries]
+
+Day and month names are rebuilt for every legacy entry the way json loading and older saves produce them
+"""
+
+import sys
+import time
+import random
+import tracemalloc
+from dataclasses import dataclass
+
+from data.data_objects import AttendanceEntry, Staff
+from data.time_data_objects import DAYS_OF_THE_WEEK, MONTHS_OF_THE_YEAR, Period, Time
+
+
+@dataclass
+class LegacyTime:
+    hour: int
+    min: int
+    sec: float
+
+@dataclass
+class LegacyPeriod:
+    time: LegacyTime
+    day: str
+    date: int
+    month: str
+    year: int
+
+@dataclass
+class LegacyAttendanceEntry:
+    period: LegacyPeriod
+    
+    staff: Staff
+    
+    is_check_in: bool = True
+
+
+def make_rows(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    
+    return [(rng.randint(6, 17), rng.randint(0, 59), rng.randint(0, 59), rng.choice(DAYS_OF_THE_WEEK), rng.randint(1, 28), rng.choice(list(MONTHS_OF_THE_YEAR)), rng.randint(2021, 2025), rng.random() < 0.5) for _ in range(size)]
+
+
+def build(entry_cls, period_cls, time_cls, rows: list[tuple], staff: Staff):
+    # "".join gives each entry its own copy of the name strings, as unpickling json built data does
+    return [entry_cls(period_cls(time_cls(hour, min, sec), "".join(day), date, "".join(month), year), staff, is_check_in) for hour, min, sec, day, date, month, year, is_check_in in rows]
+
+
+def measure(name: str, entry_cls, period_cls, time_cls, rows: list[tuple], staff: Staff):
+    tracemalloc.start()
+    entries = build(entry_cls, period_cls, time_cls, rows, staff)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    start = time.perf_counter()
+    
+    for _ in range(5):
+        for entry in entries:
+            entry.period.time.hour, entry.period.day, entry.period.month, entry.period.year, entry.is_check_in
+    
+    elapsed = time.perf_counter() - start
+    
+    print(f"{name:>7}: {used / len(entries):>7,.1f} bytes/entry  {elapsed * 1000:>8,.1f} ms attribute reads")
+    
+    return used, elapsed
+
+
+def main(args: list[str]):
+    size = int(args[0]) if args else 200_000
+    rows = make_rows(size)
+    
+    legacy_used, legacy_time = measure("legacy", LegacyAttendanceEntry, LegacyPeriod, LegacyTime, rows, None)
+    slotted_used, slotted_time = measure("slotted", AttendanceEntry, Period, Time, rows, None)
+    
+    print(f"memory: {legacy_used / slotted_used:.2f}x smaller, attribute reads {legacy_time / slotted_time:.2f}x faster over {size:,} entries")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,70 @@
+"""Opening a .cdb database with its recent scans only against opening it whole, for archives of growing age
+
+Run from the project root:  python -m benchmarks.history_bench [staff] [directory]
+
+The window is each archive's last 60 days, so the windowed open loads the same number of scans whatever the
+archive's age. The older ones are read by the background reader, the time until they are merged in is shown as well
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+from data.database import AttendanceDatabase
+from data.time_data_objects import S_DAY
+
+from benchmarks.checkin_bench import make_history
+from benchmarks.journal_bench import make_data
+
+
+def make_archive(path: str, staff_count: int, years: int):
+    data = make_data(0)
+    data.teachers = dict(list(data.teachers.items())[:staff_count])
+    
+    for entry in make_history(list(data.teachers.values()), years * 365):
+        data.attendance_data.append(entry)
+    
+    database = AttendanceDatabase(path, new=True)
+    database.checkpoint(data)
+    database.close()
+    
+    return data.attendance_data[-1].period
+
+
+def timed_open(path: str, since: float | None):
+    database = AttendanceDatabase(path)
+    
+    start = time.perf_counter()
+    data = database.load(since)
+    elapsed = time.perf_counter() - start
+    
+    database.close()
+    
+    return elapsed, data
+
+
+def main(args: list[str]):
+    staff_count = int(args[0]) if len(args) > 0 else 20
+    directory = args[1] if len(args) > 1 else tempfile.mkdtemp()
+    
+    for years in (1, 5, 10):
+        path = os.path.join(directory, f"bench-{years}.cdb")
+        last = make_archive(path, staff_count, years)
+        
+        since = (last.days - 60) * S_DAY
+        
+        full_time, full = timed_open(path, None)
+        window_time, window = timed_open(path, since)
+        
+        start = time.perf_counter()
+        window.load_history()
+        merge_time = time.perf_counter() - start
+        
+        assert len(window.attendance_data) == len(full.attendance_data)
+        
+        print(f"{years:>3} years, {len(full.attendance_data):>9,} scans: whole {full_time * 1000:>8,.1f} ms   window {window_time * 1000:>7,.1f} ms   history merged {merge_time * 1000:>8,.1f} ms later")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
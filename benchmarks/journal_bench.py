@@ -0,0 +1,84 @@
+"""Per-scan save cost of the journaled .cdat format against pickling the whole AppData on every scan
+
+Run from the project root:  python -m benchmarks.journal_bench [directory]
+
+Both are timed with histories of growing size. The journal is flushed and synced after every scan, the
+slowest way it can run, the app lets a burst of scans share one sync
+"""
+
+import os
+import sys
+import time
+import pickle
+import tempfile
+
+from data.data_objects import AttendanceEntry
+from data.journal import Journal, write_snapshot
+from data.main_data_objects import AppData
+from data.time_data_objects import Time
+
+from benchmarks.store_bench import make_staff, make_entries
+
+
+def make_data(size: int):
+    staff = make_staff(20)
+    entries = make_entries(size, staff)
+    
+    return AppData(
+        prefect_cit=Time(7, 30, 0), prefect_cot=Time(14, 0, 0),
+        teacher_cit=Time(7, 30, 0), teacher_cot=Time(14, 0, 0),
+        teacher_cin_border_interval_minutes=30, teacher_cout_border_interval_minutes=30,
+        prefect_cin_border_interval_minutes=30, prefect_cout_border_interval_minutes=30,
+        teacher_timeline_dates=[], prefect_timeline_dates=[],
+        teachers={member.id: member for member in staff}, prefects={},
+        variables={"saved": True},
+        attendance_data=entries
+    )
+
+
+def full_save(data: AppData, path: str, scans: list[AttendanceEntry]):
+    for entry in scans:
+        data.add_attendance(AttendanceEntry(entry.period, entry.staff, entry.is_check_in))
+        
+        with open(path, "wb") as file:
+            pickle.dump(data, file)
+
+def journaled_save(data: AppData, path: str, scans: list[AttendanceEntry]):
+    write_snapshot(path, data)
+    
+    journal = Journal(path, data.journal_seq)
+    data.attach_journal(journal)
+    
+    start = time.perf_counter()
+    
+    for entry in scans:
+        data.add_attendance(AttendanceEntry(entry.period, entry.staff, entry.is_check_in))
+        journal.flush()
+    
+    elapsed = time.perf_counter() - start
+    
+    journal.close()
+    data.attach_journal(None)
+    
+    return elapsed
+
+
+def main(args: list[str]):
+    directory = args[0] if args else tempfile.mkdtemp()
+    path = os.path.join(directory, "bench.cdat")
+    
+    for size in (1_000, 10_000, 100_000):
+        data = make_data(size)
+        scans = make_entries(20, list(data.teachers.values()), seed=1)
+        
+        start = time.perf_counter()
+        full_save(data, path, scans)
+        full = (time.perf_counter() - start) / len(scans)
+        
+        journaled = journaled_save(data, path, scans) / len(scans)
+        
+        print(f"{size:>9,} entries: full save {full * 1000:>9,.2f} ms/scan   journal {journaled * 1000:>7,.2f} ms/scan")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,85 @@
+"""Period comparisons/sec of the cached epoch against the original per call month lookup
+
+Run from the project root:  python -m benchmarks.period_bench [entries]
+
+A synthetic history of scans spread over several years is sorted, range checked against yearly timeline
+dates the way is_entry_countable does it, and filtered to the week before the newest scan
+"""
+
+import sys
+import time
+import random
+
+from data.time_data_objects import DAYS_OF_THE_WEEK, MONTHS_OF_THE_YEAR, Period, Time, days_in_month
+
+
+def legacy_in_seconds(period: Period):
+    prev_months = list(MONTHS_OF_THE_YEAR.values())[:list(MONTHS_OF_THE_YEAR).index(period.month)] + [0]
+    
+    days = sum(prev_months) + period.date - 1
+    
+    return period.time.in_seconds() + days * 24 * 60 * 60
+
+def legacy_in_minutes(period: Period):
+    return legacy_in_seconds(period) / 60
+
+def legacy_in_days(period: Period):
+    return legacy_in_minutes(period) / 60 / 24
+
+
+def make_history(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    history = []
+    
+    for _ in range(size):
+        month = rng.choice(list(MONTHS_OF_THE_YEAR))
+        year = rng.randint(2021, 2025)
+        
+        history.append(Period(Time(rng.randint(6, 17), rng.randint(0, 59), rng.randint(0, 59)), rng.choice(DAYS_OF_THE_WEEK), rng.randint(1, days_in_month(month, year)), month, year))
+    
+    return history
+
+
+def legacy_run(history: list[Period], start: Period, end: Period, latest: Period):
+    ordered = sorted(history, key=legacy_in_seconds)
+    countable = sum(legacy_in_minutes(start) <= legacy_in_minutes(p) <= legacy_in_minutes(end) for p in history)
+    week = sum(abs(legacy_in_days(p) - legacy_in_days(latest)) < 7 for p in history)
+    
+    return len(ordered), countable, week
+
+def epoch_run(history: list[Period], start: Period, end: Period, latest: Period):
+    ordered = sorted(history, key=Period.in_seconds)
+    countable = sum(p.within(start, end) for p in history)
+    week = sum(abs(p.in_days() - latest.in_days()) < 7 for p in history)
+    
+    return len(ordered), countable, week
+
+
+def bench(name: str, func, history: list[Period], *args):
+    start = time.perf_counter()
+    result = func(history, *args)
+    elapsed = time.perf_counter() - start
+    
+    print(f"{name:>7}: {elapsed * 1000:>9,.1f} ms  (sorted {result[0]:,}, countable {result[1]:,}, this week {result[2]:,})")
+    
+    return elapsed
+
+
+def main(args: list[str]):
+    size = int(args[0]) if args else 200_000
+    history = make_history(size)
+    
+    # Teacher timeline from src/default-data.json, year 0 repeats every year
+    start = Period(Time(0, 0, 0), "Thursday", 1, "September", 0)
+    end = Period(Time(0, 0, 0), "Friday", 31, "December", 0)
+    latest = max(history)
+    
+    legacy = bench("legacy", legacy_run, history, start, end, latest)
+    epoch = bench("epoch", epoch_run, history, start, end, latest)
+    
+    # The legacy week filter also counts scans from the same week of every other year
+    print(f"speedup: {legacy / epoch:.2f}x over {size:,} periods")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,100 @@
+"""Frames/sec of the framing, parsing and dispatch path fed from a comm capture
+
+Run from the project root:  python -m benchmarks.replay_bench [capture-file] [rounds]
+
+Captures are written by the app with -capture=<file>. Without one, a capture is synthesized from the
+IUDs in src/dbg.txt, split into the small chunks a serial port hands over at 9600 baud
+
+The capture is played at full speed through BaseCommSystem.run_replay, the path live bytes take, with only the
+Qt signals swapped for counters. The dedup window runs on the capture's timestamps, so the dispatched count is
+the same every round
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+from comm.capture import CaptureWriter, CAPTURE_IN, CAPTURE_MODE, read_capture
+from communication import BaseCommSystem, CommDevice
+
+# Seconds a serial port at 9600 baud takes for one byte
+BYTE_TIME = 10 / 9600
+
+
+def default_traffic():
+    with open("src/dbg.txt") as file:
+        iuds = [line.split(",")[1].strip() for line in file.read().strip().splitlines()]
+    
+    traffic = []
+    for i, iud in enumerate(iuds):
+        traffic.append(f"IUD:s({iud})")
+        traffic.append(f"IUD:s({iud})|rssi:n(-{40 + i})|pos:l({i}, {i + 1}, {i + 2})")
+    
+    return traffic
+
+
+class NullSignal:
+    def __init__(self):
+        self.count = 0
+    
+    def emit(self, *_):
+        self.count += 1
+    
+    def connect(self, *_):
+        pass
+
+
+def synthesize_capture(path: str, chunk_size: int = 24):
+    stream = "".join(line + "\n" for line in default_traffic() * 50).encode()
+    capture = CaptureWriter(path)
+    start = time.perf_counter()
+    
+    capture.record(CAPTURE_MODE, b"text", start)
+    for i in range(0, len(stream), chunk_size):
+        capture.record(CAPTURE_IN, stream[i:i + chunk_size], start + i * BYTE_TIME)
+    
+    capture.close()
+
+
+def make_system(path: str):
+    def raise_error(e: Exception):
+        raise e
+    
+    system = BaseCommSystem(CommDevice(NullSignal(), NullSignal(), ""), raise_error)
+    system.set_replay(path, 0)
+    
+    signal = NullSignal()
+    system.set_data_point("IUD", signal)
+    
+    return system, signal
+
+
+def main(args: list[str]):
+    rounds = int(args[1]) if len(args) > 1 else 20
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = args[0] if args else os.path.join(directory, "synthetic.cdcap")
+        
+        if not args:
+            synthesize_capture(path)
+        
+        records = list(read_capture(path))
+        inbound = sum(len(data) for _, kind, data in records if kind == CAPTURE_IN)
+        
+        system, signal = make_system(path)
+        
+        start = time.perf_counter()
+        
+        for _ in range(rounds):
+            system.run_replay()
+        
+        elapsed = time.perf_counter() - start
+        frames = system.transport.stats.lines_in.total
+    
+    print(f"{len(records)} records, {frames} frames, {signal.count // rounds} dispatched per round")
+    print(f"{rounds * frames / elapsed:,.0f} frames/s, {rounds * inbound / elapsed / 1e6:.2f} MB/s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,101 @@
+"""Chart and filter queries over the columnar attendance store against walking the entry lists
+
+Run from the project root:  python -m benchmarks.store_bench [entries]
+
+Each query is the one the staff charts run: countable check-ins of one staff member inside the timeline
+dates on their working days, the punctuality points for those, and the average check-in time
+"""
+
+import sys
+import time
+import random
+
+from data.attendance_store import AttendanceStore
+from data.data_objects import AttendanceEntry, Teacher
+from data.metadata_objects import CharacterName, Department
+from data.time_data_objects import DAYS_OF_THE_WEEK, MONTHS_OF_THE_YEAR, Period, Time, days_in_month
+
+
+def make_staff(count: int):
+    department = Department("dep_id1", "Physics")
+    
+    return [Teacher(f"t_id{i}", None, CharacterName(f"Sur{i}", f"First{i}", "", f"F{i}"), "", [], department, []) for i in range(count)]
+
+
+def make_entries(size: int, staff: list[Teacher], seed: int = 0):
+    rng = random.Random(seed)
+    entries = []
+    
+    for _ in range(size):
+        month = rng.choice(list(MONTHS_OF_THE_YEAR))
+        year = rng.randint(2016, 2025)
+        period = Period(Time(rng.randint(6, 17), rng.randint(0, 59), rng.randint(0, 59)), rng.choice(DAYS_OF_THE_WEEK), rng.randint(1, days_in_month(month, year)), month, year)
+        
+        entry = AttendanceEntry(period, rng.choice(staff), rng.random() < 0.5)
+        entry.staff.attendance.append(entry)
+        entries.append(entry)
+    
+    return entries
+
+
+def is_entry_countable(entry: AttendanceEntry, valid_days: list[str], timeline_dates: list[tuple[Period, Period]]):
+    # Copy of BaseDataDisplayWidget.is_entry_countable, which needs Qt to import
+    time_line_index = next((i for i, t_d in enumerate(timeline_dates) if entry.period.within(*t_d)), None)
+    
+    if entry.is_check_in and entry.period.day in valid_days and time_line_index is not None:
+        return time_line_index
+
+
+def list_queries(staff: Teacher, working_days: list[str], timeline_dates: list[tuple[Period, Period]], cit: Time):
+    countable = [entry for entry in staff.attendance if is_entry_countable(entry, working_days, timeline_dates) is not None]
+    punctuality = [cit.in_minutes() - entry.period.time.in_minutes() for entry in countable]
+    cins = [entry.period.time.in_seconds() for entry in staff.attendance if entry.is_check_in]
+    
+    return len(countable), sum(punctuality), sum(cins) / len(cins)
+
+def store_queries(store: AttendanceStore, staff: Teacher, working_days: list[str], timeline_dates: list[tuple[Period, Period]], cit: Time):
+    countable = store.countable_mask(working_days, timeline_dates, staff)
+    punctuality = (cit.in_seconds() - store.day_seconds[countable]) / 60
+    cins = store.day_seconds[store.staff_mask(staff) & store.check_in]
+    
+    return int(countable.sum()), float(punctuality.sum()), float(cins.mean())
+
+
+def bench(name: str, func, rounds: int):
+    start = time.perf_counter()
+    
+    for _ in range(rounds):
+        result = func()
+    
+    elapsed = (time.perf_counter() - start) / rounds
+    
+    print(f"{name:>7}: {elapsed * 1000:>9,.2f} ms per chart refresh  (countable {result[0]:,})")
+    
+    return elapsed, result
+
+
+def main(args: list[str]):
+    size = int(args[0]) if args else 1_000_000
+    
+    staff = make_staff(8)
+    entries = make_entries(size, staff)
+    
+    start = time.perf_counter()
+    store = AttendanceStore(entries)
+    print(f"  built: {(time.perf_counter() - start) * 1000:>9,.1f} ms for {size:,} entries")
+    
+    timeline_dates = [(Period(Time(0, 0, 0), "Thursday", 1, "January", 0), Period(Time(0, 0, 0), "Friday", 31, "December", 0))]
+    working_days = DAYS_OF_THE_WEEK[:5]
+    cit = Time(7, 30, 0)
+    
+    # Every staff member's chart is rebuilt on a data change, so the whole history is queried once per staff
+    list_time, list_result = bench("lists", lambda: [list_queries(s, working_days, timeline_dates, cit) for s in staff][0], 1)
+    store_time, store_result = bench("store", lambda: [store_queries(store, s, working_days, timeline_dates, cit) for s in staff][0], 5)
+    
+    assert list_result[0] == store_result[0] and abs(list_result[1] - store_result[1]) < 1e-3 * abs(list_result[1]), (list_result, store_result)
+    
+    print(f"speedup: {list_time / store_time:.1f}x over {size:,} entries and {len(staff)} staff")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
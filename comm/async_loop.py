@@ -0,0 +1,65 @@
+import asyncio
+import threading
+from typing import Coroutine
+
+
+class AsyncLoopThread:
+    def __init__(self, name: str = "comm-io"):
+        self.name = name
+        self.loop = asyncio.new_event_loop()
+        
+        self._thread: threading.Thread | None = None
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+    
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            
+            self._started.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        
+        self._started.wait()
+    
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        
+        self.loop.call_soon(self._started.set)
+        self.loop.run_forever()
+    
+    def submit(self, coro: Coroutine):
+        self.start()
+        
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def call_soon(self, func, *args):
+        self.start()
+        
+        return self.loop.call_soon_threadsafe(func, *args)
+    
+    def in_loop_thread(self):
+        return threading.current_thread() is self._thread
+    
+    def stop(self):
+        if self.running:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+
+
+_IO_LOOP: AsyncLoopThread | None = None
+_IO_LOOP_LOCK = threading.Lock()
+
+def get_io_loop():
+    global _IO_LOOP
+    
+    with _IO_LOOP_LOCK:
+        if _IO_LOOP is None:
+            _IO_LOOP = AsyncLoopThread()
+    
+    return _IO_LOOP
@@ -0,0 +1,47 @@
+import threading
+from typing import Callable
+
+
+class IngestBuffer:
+    def __init__(self, notify: Callable[[], None]):
+        # notify is a queued signal emit, it fires once per batch rather than once per scan
+        self.notify = notify
+        
+        self._items: list[tuple] = []
+        self._lock = threading.Lock()
+        self._scheduled = False
+        
+        self.batches = 0
+        self.items = 0
+        self.max_batch = 0
+    
+    def emit(self, *item):
+        with self._lock:
+            self._items.append(item)
+            
+            schedule = not self._scheduled
+            self._scheduled = True
+        
+        if schedule:
+            self.notify()
+    
+    def drain(self):
+        # Everything that arrived while the GUI thread was busy comes out as one batch
+        with self._lock:
+            items, self._items = self._items, []
+            self._scheduled = False
+        
+        if items:
+            self.batches += 1
+            self.items += len(items)
+            self.max_batch = max(self.max_batch, len(items))
+        
+        return items
+    
+    def metrics(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "max_batch": self.max_batch,
+            "mean_batch": self.items / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,60 @@
+import struct
+import threading
+import time
+from typing import Iterator
+
+CAPTURE_MAGIC = b"CDCAP\x01"
+
+CAPTURE_IN = 0
+CAPTURE_OUT = 1
+CAPTURE_MODE = 2
+
+# Seconds since the capture started, record kind, byte count
+CAPTURE_RECORD = struct.Struct("<dBI")
+
+
+class CaptureWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0
+        
+        self._file = open(path, "wb")
+        self._file.write(CAPTURE_MAGIC)
+        
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+    
+    def record(self, kind: int, data: bytes, timestamp: float | None = None):
+        # Reader and writer threads both record, the lock keeps their records whole
+        t = (time.perf_counter() if timestamp is None else timestamp) - self._start
+        
+        with self._lock:
+            if self._file.closed:
+                return
+            
+            self._file.write(CAPTURE_RECORD.pack(t, kind, len(data)))
+            self._file.write(data)
+            self.records += 1
+    
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_capture(path: str) -> Iterator[tuple[float, int, bytes]]:
+    with open(path, "rb") as file:
+        if file.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a comm capture file")
+        
+        while header := file.read(CAPTURE_RECORD.size):
+            if len(header) < CAPTURE_RECORD.size:
+                break
+            
+            t, kind, length = CAPTURE_RECORD.unpack(header)
+            data = file.read(length)
+            
+            # A capture cut short by a crash ends at its last whole record
+            if len(data) < length:
+                break
+            
+            yield t, kind, data
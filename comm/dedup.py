@@ -0,0 +1,50 @@
+import time
+from collections import OrderedDict
+
+
+class ScanDeduplicator:
+    def __init__(self, window: float = 2.0, capacity: int = 256, key: str = "IUD"):
+        self.window = window
+        self.capacity = capacity
+        self.key = key
+        
+        # IUD -> when it was last let through, oldest first
+        self._seen: OrderedDict[str, float] = OrderedDict()
+        
+        self.passed = 0
+        self.dropped = 0
+    
+    def accept(self, full_data: dict, now: float | None = None):
+        value = full_data.get(self.key)
+        
+        # Only string IUDs are tracked, the comm system rejects frames with any other kind before they get here
+        if not isinstance(value, str) or self.window <= 0:
+            return True
+        
+        now = time.monotonic() if now is None else now
+        last = self._seen.get(value)
+        
+        if last is not None and now - last < self.window:
+            self.dropped += 1
+            return False
+        
+        self._seen[value] = now
+        self._seen.move_to_end(value)
+        
+        # Anything pushed out is older than the window unless more than capacity cards are scanned inside it
+        while len(self._seen) > self.capacity:
+            self._seen.popitem(last=False)
+        
+        self.passed += 1
+        return True
+    
+    def reset(self):
+        self._seen.clear()
+    
+    def metrics(self):
+        return {
+            "window": self.window,
+            "passed": self.passed,
+            "dropped": self.dropped,
+            "tracked": len(self._seen),
+        }
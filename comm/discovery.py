@@ -0,0 +1,198 @@
+import time
+import asyncio
+import threading
+from typing import Callable
+from dataclasses import dataclass
+
+from bleak import BleakScanner
+
+from comm.async_loop import AsyncLoopThread, get_io_loop
+
+
+@dataclass
+class DiscoveredDevice:
+    address: str
+    name: str
+    rssi: int | None
+    last_seen: float
+
+
+class DeviceCache:
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        
+        self._devices: dict[str, DiscoveredDevice] = {}
+        self._lock = threading.Lock()
+    
+    def update(self, address: str, name: str, rssi: int | None = None):
+        now = time.monotonic()
+        
+        with self._lock:
+            device = self._devices.get(address)
+            
+            if device is None:
+                self._devices[address] = DiscoveredDevice(address, name, rssi, now)
+                return True
+            
+            changed = device.name != name
+            
+            device.name = name
+            device.rssi = rssi
+            device.last_seen = now
+            
+            return changed
+    
+    def prune(self):
+        deadline = time.monotonic() - self.ttl
+        
+        with self._lock:
+            expired = [address for address, device in self._devices.items() if device.last_seen < deadline]
+            
+            for address in expired:
+                del self._devices[address]
+        
+        return expired
+    
+    def devices(self):
+        with self._lock:
+            return sorted(((device.address, device.name) for device in self._devices.values()), key=lambda device: device[1])
+
+
+class BLEDiscovery:
+    def __init__(self, io_loop: AsyncLoopThread, ttl: float = 30.0):
+        self.io_loop = io_loop
+        self.cache = DeviceCache(ttl)
+        
+        # Called from the IO thread with the full (address, name) list whenever it changes
+        self.listeners: list[Callable[[list[tuple[str, str]]], None]] = []
+        self.error_listeners: list[Callable[[Exception], None]] = []
+        
+        self.running = False
+        
+        # Connects in progress, the scanner stays off until the last one is done
+        self._wanted = False
+        self._paused = 0
+        
+        self._scanner: BleakScanner | None = None
+        self._starting: asyncio.Future | None = None
+        self._prune_task: asyncio.Task | None = None
+    
+    def add_listener(self, listener: Callable[[list[tuple[str, str]]], None]):
+        self.listeners.append(listener)
+    
+    def add_error_listener(self, listener: Callable[[Exception], None]):
+        self.error_listeners.append(listener)
+    
+    def devices(self):
+        return self.cache.devices()
+    
+    def _notify(self):
+        devices = self.cache.devices()
+        
+        for listener in self.listeners:
+            listener(devices)
+    
+    def _detected(self, device, advertisement_data):
+        name = device.name or advertisement_data.local_name or "Unknown device"
+        
+        if self.cache.update(device.address, name, advertisement_data.rssi):
+            self._notify()
+    
+    async def _prune_loop(self):
+        while True:
+            await asyncio.sleep(self.cache.ttl / 2)
+            
+            if self.cache.prune():
+                self._notify()
+    
+    async def _scan(self):
+        if self.running or self._paused or not self._wanted:
+            return
+        
+        # Marked running before the await, a start arriving meanwhile does nothing and a pause or stop waits for
+        # this start to finish and then undoes it
+        self.running = True
+        
+        scanner = self._scanner = BleakScanner(detection_callback=self._detected)
+        starting = self._starting = asyncio.ensure_future(scanner.start())
+        
+        try:
+            await starting
+        except Exception as e:
+            if self._scanner is scanner:
+                self.running = False
+                self._scanner = None
+            
+            for listener in self.error_listeners:
+                listener(e)
+            
+            return
+        finally:
+            if self._starting is starting:
+                self._starting = None
+        
+        if self._scanner is scanner:
+            self._prune_task = asyncio.get_running_loop().create_task(self._prune_loop())
+    
+    async def _halt(self):
+        if not self.running:
+            return
+        
+        self.running = False
+        
+        scanner, self._scanner = self._scanner, None
+        starting, self._starting = self._starting, None
+        
+        if self._prune_task is not None:
+            self._prune_task.cancel()
+            self._prune_task = None
+        
+        if starting is not None:
+            try:
+                await starting
+            except Exception:
+                # It never started, _scan reports the error
+                return
+        
+        await scanner.stop()
+    
+    async def _start(self):
+        self._wanted = True
+        await self._scan()
+    
+    async def _stop(self):
+        self._wanted = False
+        await self._halt()
+    
+    async def _pause(self):
+        self._paused += 1
+        await self._halt()
+    
+    async def _resume(self):
+        self._paused = max(self._paused - 1, 0)
+        await self._scan()
+    
+    def start(self):
+        return self.io_loop.submit(self._start())
+    
+    def stop(self):
+        return self.io_loop.submit(self._stop())
+    
+    def pause(self):
+        return self.io_loop.submit(self._pause())
+    
+    def resume(self):
+        return self.io_loop.submit(self._resume())
+
+
+_BLE_DISCOVERY: BLEDiscovery | None = None
+_BLE_DISCOVERY_LOCK = threading.Lock()
+
+def get_ble_discovery():
+    global _BLE_DISCOVERY
+    
+    with _BLE_DISCOVERY_LOCK:
+        if _BLE_DISCOVERY is None:
+            _BLE_DISCOVERY = BLEDiscovery(get_io_loop())
+    
+    return _BLE_DISCOVERY
@@ -0,0 +1,92 @@
+from typing import Any, Protocol
+
+
+class Emitter(Protocol):
+    def emit(self, *args: Any): ...
+
+
+_MISSING = object()
+
+
+class CompositeSubscription:
+    def __init__(self, keys: tuple[str, ...], signal: Emitter):
+        self.keys = keys
+        self.signal = signal
+        
+        # Kept across messages, fields of one composite may arrive in separate frames
+        self.buffer: list[Any] = [_MISSING] * len(keys)
+        self.missing = len(keys)
+    
+    def __hash__(self):
+        return hash((self.keys, id(self.signal)))
+    
+    def __eq__(self, other):
+        return isinstance(other, CompositeSubscription) and self.keys == other.keys and self.signal is other.signal
+    
+    def fill(self, index: int, value: Any):
+        if self.buffer[index] is _MISSING:
+            self.missing -= 1
+        
+        self.buffer[index] = value
+        
+        if self.missing:
+            return None
+        
+        values = self.buffer
+        
+        self.buffer = [_MISSING] * len(self.keys)
+        self.missing = len(self.keys)
+        
+        return values
+    
+    def reset(self):
+        self.buffer = [_MISSING] * len(self.keys)
+        self.missing = len(self.keys)
+
+
+class DataDispatcher:
+    def __init__(self):
+        self._subscribers: dict[str, list[Emitter]] = {}
+        self._composite_index: dict[str, list[tuple[CompositeSubscription, int]]] = {}
+        
+        self.composites: set[CompositeSubscription] = set()
+    
+    def subscribe(self, key: str | list[str] | set[str] | tuple[str, ...], signal: Emitter):
+        if isinstance(key, str):
+            self._subscribers.setdefault(key, []).append(signal)
+        elif isinstance(key, (list, set, tuple)):
+            subscription = CompositeSubscription(tuple(key), signal)
+            
+            if subscription in self.composites:
+                return
+            
+            self.composites.add(subscription)
+            
+            for index, field in enumerate(subscription.keys):
+                self._composite_index.setdefault(field, []).append((subscription, index))
+        else:
+            raise TypeError(f"Bad key type: {type(key)}")
+    
+    def reset(self):
+        for subscription in self.composites:
+            subscription.reset()
+    
+    def dispatch(self, full_data: dict[str, Any]):
+        subscribers = self._subscribers
+        composite_index = self._composite_index
+        
+        for key, info in full_data.items():
+            signals = subscribers.get(key)
+            
+            if signals is not None:
+                for signal in signals:
+                    signal.emit(info)
+            
+            parts = composite_index.get(key)
+            
+            if parts is not None:
+                for subscription, index in parts:
+                    values = subscription.fill(index, info)
+                    
+                    if values is not None:
+                        subscription.signal.emit(values)
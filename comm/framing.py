@@ -0,0 +1,256 @@
+import zlib
+import struct
+
+from comm.protocol import ProtocolError
+
+
+class LineFramer:
+    def __init__(self, delimiter: bytes = b"\n", max_length: int = 4096):
+        self.delimiter = delimiter
+        self.max_length = max_length
+        
+        self.dropped = 0
+        
+        self._buffer = bytearray()
+    
+    def feed(self, data: bytes):
+        self._buffer += data
+        
+        if self.delimiter not in data:
+            if len(self._buffer) > self.max_length:
+                # Runaway line (noise on the wire), there is no way to recover the frame
+                self._buffer.clear()
+                self.dropped += 1
+            
+            return []
+        
+        *frames, rest = self._buffer.split(self.delimiter)
+        self._buffer = bytearray(rest)
+        
+        return frames
+    
+    def flush(self):
+        # Hands back the bytes of a frame still being received
+        pending = bytes(self._buffer)
+        self._buffer.clear()
+        
+        return pending
+    
+    def reset(self):
+        self._buffer.clear()
+
+
+# Binary frame:  magic | payload length (u16) | payload | crc32 of payload (u32), little endian
+# Payload field: name length (u8) | name | type tag | value
+#   s: length (u16) + utf-8 text,  n: f64,  l: count (u16) + count * f64
+FRAME_MAGIC = 0xA5
+FRAME_HEADER = struct.Struct("<BH")
+FRAME_CRC = struct.Struct("<I")
+MAX_PAYLOAD = 0xFFFF
+
+# Gates send a few short fields, a longer length is a corrupted header and waiting for it would stall the link
+MAX_GATE_PAYLOAD = 1024
+
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_F64 = struct.Struct("<d")
+
+# Appended to the password echo by firmware that can speak binary frames
+BINARY_CAPABILITY = "+bin"
+
+
+def frame_mode_from_echo(pswd: str, response: str):
+    if response == pswd:
+        return "text"
+    elif response == pswd + BINARY_CAPABILITY:
+        return "binary"
+    
+    return None
+
+
+def encode_binary_payload(fields: dict[str, str | float | int | list]):
+    payload = bytearray()
+    
+    for name, value in fields.items():
+        name_bytes = name.encode()
+        payload += _U8.pack(len(name_bytes)) + name_bytes
+        
+        if isinstance(value, str):
+            text = value.encode()
+            payload += b"s" + _U16.pack(len(text)) + text
+        elif isinstance(value, (list, tuple)):
+            payload += b"l" + _U16.pack(len(value)) + struct.pack(f"<{len(value)}d", *value)
+        elif isinstance(value, (int, float)):
+            payload += b"n" + _F64.pack(value)
+        else:
+            raise ProtocolError(f"Type: {type(value)} cannot be encoded")
+    
+    return bytes(payload)
+
+def encode_binary_frame(fields: dict[str, str | float | int | list]):
+    payload = encode_binary_payload(fields)
+    
+    if len(payload) > MAX_PAYLOAD:
+        raise ProtocolError(f"Frame payload too large: {len(payload)} bytes")
+    
+    return FRAME_HEADER.pack(FRAME_MAGIC, len(payload)) + payload + FRAME_CRC.pack(zlib.crc32(payload))
+
+def decode_binary_payload(payload: bytes):
+    fields = {}
+    pos = 0
+    end = len(payload)
+    
+    try:
+        while pos < end:
+            name_len = payload[pos]
+            name = payload[pos + 1:pos + 1 + name_len].decode()
+            pos += 1 + name_len
+            
+            var_type = payload[pos:pos + 1]
+            pos += 1
+            
+            if var_type == b"s":
+                (length, ) = _U16.unpack_from(payload, pos)
+                fields[name] = payload[pos + 2:pos + 2 + length].decode()
+                pos += 2 + length
+            elif var_type == b"n":
+                (fields[name], ) = _F64.unpack_from(payload, pos)
+                pos += 8
+            elif var_type == b"l":
+                (count, ) = _U16.unpack_from(payload, pos)
+                fields[name] = list(struct.unpack_from(f"<{count}d", payload, pos + 2))
+                pos += 2 + count * 8
+            else:
+                raise ProtocolError(f"Type: ({var_type!r}) is not a valid type")
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ProtocolError(f"Truncated binary payload: {e}") from None
+    
+    if pos != end:
+        raise ProtocolError("Binary payload overruns its frame")
+    
+    return fields
+
+
+def _fits(buffer: bytearray, length: int):
+    # Walks the fields received so far, a header whose length they cannot fill exactly is corrupted. This catches
+    # a bad length without waiting for all the bytes it claims
+    pos = FRAME_HEADER.size
+    end = pos + length
+    available = len(buffer)
+    
+    while pos < end:
+        if pos >= available:
+            return True
+        
+        pos += 1 + buffer[pos]
+        
+        if pos >= end:
+            return False
+        
+        if pos >= available:
+            return True
+        
+        var_type = buffer[pos]
+        pos += 1
+        
+        if var_type == 0x6E:  # n
+            pos += 8
+            continue
+        
+        if var_type not in b"sl":
+            return False
+        
+        if pos + 2 > available:
+            return True
+        
+        (size, ) = _U16.unpack_from(buffer, pos)
+        pos += 2 + (size if var_type == 0x73 else size * 8)  # s: bytes, l: f64s
+    
+    return pos == end
+
+
+class BinaryFramer:
+    def __init__(self, max_length: int = MAX_GATE_PAYLOAD):
+        self.max_length = max_length
+        
+        self.dropped = 0
+        
+        self._buffer = bytearray()
+        
+        # A lost frame is counted once, the bytes skipped while resyncing past it are not counted again
+        self._resyncing = False
+        self._lost = 0
+    
+    def _skip(self, count: int):
+        # Bytes that cannot start a frame
+        if not self._resyncing:
+            self._resyncing = True
+            self.dropped += 1
+        
+        del self._buffer[:count]
+        self._lost = max(self._lost - count, 0)
+    
+    def _reject(self, span: int):
+        # The frame at the start of the buffer is bad, span is how far it claimed to reach (1 when unknown)
+        if not self._resyncing or (span > 1 and not self._lost):
+            self.dropped += 1
+        
+        self._resyncing = True
+        self._lost = max(self._lost, span) - 1
+        
+        del self._buffer[:1]
+    
+    def feed(self, data: bytes):
+        self._buffer += data
+        frames = []
+        
+        buffer = self._buffer
+        overhead = FRAME_HEADER.size + FRAME_CRC.size
+        
+        while buffer:
+            start = buffer.find(FRAME_MAGIC)
+            
+            if start < 0:
+                self._skip(len(buffer))
+                break
+            
+            if start:
+                self._skip(start)
+            
+            if len(buffer) < FRAME_HEADER.size:
+                break
+            
+            _, length = FRAME_HEADER.unpack_from(buffer)
+            
+            if length > self.max_length:
+                self._reject(1)
+                continue
+            
+            if not _fits(buffer, length):
+                self._reject(1)
+                continue
+            
+            if len(buffer) < length + overhead:
+                break
+            
+            payload = bytes(buffer[FRAME_HEADER.size:FRAME_HEADER.size + length])
+            (crc, ) = FRAME_CRC.unpack_from(buffer, FRAME_HEADER.size + length)
+            
+            if crc != zlib.crc32(payload):
+                # Corrupted frame, resync on the next magic byte instead of trusting its length
+                self._reject(length + overhead)
+                continue
+            
+            del buffer[:length + overhead]
+            frames.append(payload)
+            
+            self._resyncing = False
+            self._lost = 0
+        
+        return frames
+    
+    def reset(self):
+        self._buffer.clear()
+        
+        self._resyncing = False
+        self._lost = 0
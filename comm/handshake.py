@@ -0,0 +1,115 @@
+import time
+from typing import Literal
+
+from comm.framing import BINARY_CAPABILITY, frame_mode_from_echo
+
+
+class PasswordException(Exception):
+    pass
+
+
+class Handshake:
+    def __init__(self, pswd: str, allow_binary: bool = True, first_retry: float = 0.05, max_retry: float = 0.25, timeout: float = 17.0, max_mismatches: int = 3):
+        self.pswd = pswd
+        self.allow_binary = allow_binary
+        
+        # Probes start right away and back off, a board still in its bootloader just misses the early ones
+        self.first_retry = first_retry
+        self.max_retry = max_retry
+        self.timeout = timeout
+        self.max_mismatches = max_mismatches
+        
+        self.state: Literal["idle", "probing", "ready", "failed"] = "idle"
+        self.frame_mode: Literal["text", "binary"] | None = None
+        
+        self.probes = 0
+        self.mismatches = 0
+        
+        self.started = 0.0
+        self.finished = 0.0
+        
+        self._retry = first_retry
+        self._next_probe = 0.0
+    
+    @property
+    def done(self):
+        return self.state in ("ready", "failed")
+    
+    @property
+    def latency(self):
+        return self.finished - self.started if self.done else time.monotonic() - self.started
+    
+    def _probe(self, now: float):
+        self.probes += 1
+        self._next_probe = now + self._retry
+        self._retry = min(self._retry * 2, self.max_retry)
+        
+        return (self.pswd + "\n").encode()
+    
+    def _finish(self, state: Literal["ready", "failed"], now: float):
+        self.state = state
+        self.finished = now
+    
+    def start(self, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        
+        self.state = "probing"
+        self.started = now
+        
+        return self._probe(now)
+    
+    def poll(self, now: float | None = None):
+        # Returns the bytes to write when a retry is due
+        now = time.monotonic() if now is None else now
+        
+        if self.state != "probing":
+            return None
+        
+        if now - self.started >= self.timeout:
+            self._finish("failed", now)
+            return None
+        
+        if now >= self._next_probe:
+            return self._probe(now)
+        
+        return None
+    
+    def wait_time(self, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        
+        return max(0.0, min(self._next_probe, self.started + self.timeout) - now)
+    
+    def on_line(self, line: str, now: float | None = None):
+        # Returns the bytes to write in answer, the binary acknowledgement
+        now = time.monotonic() if now is None else now
+        
+        if self.state != "probing":
+            return None
+        
+        frame_mode = frame_mode_from_echo(self.pswd, line.strip())
+        
+        if frame_mode is None:
+            # Boot banners and line noise are tolerated, a device that keeps answering wrong is not ours
+            self.mismatches += 1
+            
+            if self.mismatches >= self.max_mismatches:
+                self._finish("failed", now)
+            
+            return None
+        
+        self._finish("ready", now)
+        
+        if frame_mode == "binary" and self.allow_binary:
+            self.frame_mode = "binary"
+            
+            return (BINARY_CAPABILITY + "\n").encode()
+        
+        self.frame_mode = "text"
+        
+        return None
+    
+    def error(self):
+        if self.mismatches >= self.max_mismatches:
+            return PasswordException("Internal password check failed\nDevice is not a registered attendance device")
+        
+        return PasswordException(f"Device did not answer the password check within {self.timeout:g}s\nDevice is not a registered attendance device")
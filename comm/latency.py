@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Stages of one scan, from the first byte of its frame to the reply leaving for the device
+SCAN_STAGES = ("parsed", "emitted", "handler_start", "handler_end", "saved", "reply_enqueued", "reply_written")
+
+
+class LatencyHistogram:
+    def __init__(self, significant_bits: int = 5):
+        # Buckets keep significant_bits of the value in microseconds, about 3% error at any magnitude
+        self.significant_bits = significant_bits
+        
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+    
+    def _bucket(self, value: int):
+        shift = max(0, value.bit_length() - self.significant_bits)
+        
+        return (value >> shift) << shift, (1 << shift) - 1
+    
+    def record(self, seconds: float):
+        value = max(0, int(seconds * 1_000_000))
+        low, _ = self._bucket(value)
+        
+        self.buckets[low] = self.buckets.get(low, 0) + 1
+        
+        self.min = value if not self.count else min(self.min, value)
+        self.max = max(self.max, value)
+        self.total += value
+        self.count += 1
+    
+    def percentile(self, pct: float):
+        if not self.count:
+            return 0.0
+        
+        target = max(1, round(self.count * pct / 100))
+        seen = 0
+        
+        for low in sorted(self.buckets):
+            seen += self.buckets[low]
+            
+            if seen >= target:
+                _, width = self._bucket(low)
+                return min(low + width, self.max) / 1_000_000
+        
+        return self.max / 1_000_000
+    
+    def mean(self):
+        return self.total / self.count / 1_000_000 if self.count else 0.0
+    
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.mean() * 1000,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max / 1000,
+        }
+
+
+class ScanTrace:
+    __slots__ = ("key", "arrival", "stamps")
+    
+    def __init__(self, key: str, arrival: float):
+        self.key = key
+        self.arrival = arrival
+        self.stamps: dict[str, float] = {}
+
+
+class LatencyTracker:
+    def __init__(self, history: int = 1024):
+        self.enabled = True
+        
+        self.histograms = {stage: LatencyHistogram() for stage in SCAN_STAGES}
+        self.traces: deque[ScanTrace] = deque(maxlen=history)
+        
+        # Set on the GUI thread while a scan is being handled, replies sent meanwhile belong to it
+        self.current: ScanTrace | None = None
+        
+        self._pending: dict[str, ScanTrace] = {}
+        self._lock = threading.Lock()
+    
+    def begin(self, key: str, arrival: float | None = None):
+        if not self.enabled:
+            return None
+        
+        trace = ScanTrace(key, time.perf_counter() if arrival is None else arrival)
+        
+        with self._lock:
+            self._pending[key] = trace
+            self.traces.append(trace)
+        
+        return trace
+    
+    def stamp(self, trace: ScanTrace | None, stage: str, now: float | None = None):
+        if trace is None:
+            return
+        
+        now = time.perf_counter() if now is None else now
+        
+        with self._lock:
+            # Only the first reply of a scan counts, the greeting that follows it rides along
+            if stage not in trace.stamps:
+                trace.stamps[stage] = now
+                self.histograms[stage].record(now - trace.arrival)
+    
+    def take(self, key: str):
+        with self._lock:
+            return self._pending.pop(key, None)
+    
+    @contextmanager
+    def handling(self, key: str):
+        trace = self.take(key)
+        
+        self.stamp(trace, "handler_start")
+        self.current = trace
+        
+        try:
+            yield trace
+        finally:
+            self.current = None
+            self.stamp(trace, "handler_end")
+    
+    def summary(self):
+        with self._lock:
+            return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+    
+    def to_str(self):
+        lines = [f"{'since arrival':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        
+        for stage, stats in self.summary().items():
+            lines.append(f"{stage:<16}{stats['count']:>8}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+        
+        return "\n".join(lines)
+    
+    def dump(self, path: str):
+        with self._lock:
+            traces = [
+                {"key": trace.key, "arrival": trace.arrival, **{stage: t - trace.arrival for stage, t in trace.stamps.items()}}
+                for trace in self.traces
+            ]
+            histograms = {stage: {"summary": histogram.summary(), "buckets_us": histogram.buckets} for stage, histogram in self.histograms.items()}
+        
+        with open(path, "w") as file:
+            json.dump({"stages": SCAN_STAGES, "histograms": histograms, "traces": traces}, file, indent=1)
+    
+    def reset(self):
+        with self._lock:
+            self.histograms = {stage: LatencyHistogram() for stage in SCAN_STAGES}
+            self.traces.clear()
+            self._pending.clear()
+
+
+_TRACKER: LatencyTracker | None = None
+_TRACKER_LOCK = threading.Lock()
+
+def get_latency_tracker():
+    global _TRACKER
+    
+    with _TRACKER_LOCK:
+        if _TRACKER is None:
+            _TRACKER = LatencyTracker()
+    
+    return _TRACKER
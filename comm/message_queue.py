@@ -0,0 +1,222 @@
+import heapq
+import threading
+import time
+from itertools import count
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from comm.stats import LatencyStats
+
+STATUS_PRIORITY = 0
+DISPLAY_PRIORITY = 1
+
+# Short codes the device firmware reacts to (buzzer, LEDs), everything else is display text
+STATUS_CODES = {"SCANNED", "UNSCANNED", "REGISTERED", "UNREGISTERED", "SCANNING"}
+
+DISPLAY_KEY = "display"
+
+
+@dataclass(slots=True)
+class OutboundMessage:
+    text: str
+    priority: int
+    enqueued: float
+    due: float
+    coalesce_key: str | None = None
+    seq: int = 0
+    cancelled: bool = field(default=False, compare=False)
+    trace: Any = field(default=None, compare=False)
+
+
+class OutboundQueue:
+    def __init__(self, maxsize: int = 64, max_batch: int = 16):
+        self.maxsize = maxsize
+        self.max_batch = max_batch
+        
+        self._cond = threading.Condition()
+        self._seq = count()
+        
+        self._ready: list[tuple[int, int, OutboundMessage]] = []
+        self._delayed: list[tuple[float, int, OutboundMessage]] = []
+        self._pending_keys: dict[str, OutboundMessage] = {}
+        self._interrupted = False
+        
+        # Called after a put, requeue or wake, for a consumer that waits on an event loop instead of get_batch
+        self.on_ready: Callable[[], None] | None = None
+        
+        self.depth = 0
+        self.max_depth = 0
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.send_latency = LatencyStats()
+    
+    def __len__(self):
+        return self.depth
+    
+    def _live(self):
+        return [msg for *_, msg in self._ready + self._delayed if not msg.cancelled]
+    
+    def _release(self, msg: OutboundMessage):
+        self.depth -= 1
+        
+        if msg.coalesce_key is not None and self._pending_keys.get(msg.coalesce_key) is msg:
+            del self._pending_keys[msg.coalesce_key]
+    
+    def _discard(self, msg: OutboundMessage):
+        msg.cancelled = True
+        self._release(msg)
+    
+    def put(self, text: str, priority: int | None = None, delay: float = 0.0, coalesce_key: str | None = ..., trace: Any = None):
+        if priority is None:
+            priority = STATUS_PRIORITY if text.strip() in STATUS_CODES else DISPLAY_PRIORITY
+        
+        if coalesce_key is ...:
+            coalesce_key = DISPLAY_KEY if priority == DISPLAY_PRIORITY else None
+        
+        now = time.monotonic()
+        msg = OutboundMessage(text, priority, now, now + delay, coalesce_key, next(self._seq), trace=trace)
+        
+        with self._cond:
+            if coalesce_key is not None and coalesce_key in self._pending_keys:
+                # A newer display text makes the one still waiting to be written stale
+                self._discard(self._pending_keys[coalesce_key])
+                self.coalesced += 1
+            
+            if self.depth >= self.maxsize:
+                victim = max(self._live(), key=lambda m: (m.priority, -m.seq))
+                
+                if victim.priority < priority:
+                    self.dropped += 1
+                    return False
+                
+                self._discard(victim)
+                self.dropped += 1
+            
+            if delay > 0:
+                heapq.heappush(self._delayed, (msg.due, msg.seq, msg))
+            else:
+                heapq.heappush(self._ready, (msg.priority, msg.seq, msg))
+            
+            if coalesce_key is not None:
+                self._pending_keys[coalesce_key] = msg
+            
+            self.depth += 1
+            self.max_depth = max(self.max_depth, self.depth)
+            
+            self._cond.notify()
+        
+        self._ready_callback()
+        
+        return True
+    
+    def _promote_due(self, now: float):
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, msg = heapq.heappop(self._delayed)
+            
+            if not msg.cancelled:
+                heapq.heappush(self._ready, (msg.priority, msg.seq, msg))
+    
+    def _pop_ready(self):
+        batch = []
+        
+        while self._ready and len(batch) < self.max_batch:
+            _, _, msg = heapq.heappop(self._ready)
+            
+            if not msg.cancelled:
+                self._release(msg)
+                batch.append(msg)
+        
+        return batch
+    
+    def get_batch(self, timeout: float | None = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._promote_due(now)
+                
+                batch = self._pop_ready()
+                
+                if batch or self._interrupted:
+                    self._interrupted = False
+                    return batch
+                
+                waits = []
+                
+                if deadline is not None:
+                    if now >= deadline:
+                        return []
+                    
+                    waits.append(deadline - now)
+                
+                if self._delayed:
+                    waits.append(self._delayed[0][0] - now)
+                
+                self._cond.wait(min(waits) if waits else None)
+    
+    def requeue(self, batch: list[OutboundMessage]):
+        # A batch that was popped but never written goes back in its old place
+        with self._cond:
+            for msg in batch:
+                if msg.coalesce_key is not None and msg.coalesce_key in self._pending_keys:
+                    # A newer display text was queued meanwhile, it stays
+                    self.coalesced += 1
+                    continue
+                
+                heapq.heappush(self._ready, (msg.priority, msg.seq, msg))
+                
+                if msg.coalesce_key is not None:
+                    self._pending_keys[msg.coalesce_key] = msg
+                
+                self.depth += 1
+            
+            self.max_depth = max(self.max_depth, self.depth)
+            self._cond.notify()
+        
+        self._ready_callback()
+    
+    def _ready_callback(self):
+        on_ready = self.on_ready
+        
+        if on_ready is not None:
+            on_ready()
+    
+    def next_due(self):
+        # Seconds until the earliest delayed message is due, None without any
+        with self._cond:
+            return max(self._delayed[0][0] - time.monotonic(), 0.0) if self._delayed else None
+    
+    def mark_sent(self, batch: list[OutboundMessage]):
+        now = time.monotonic()
+        
+        for msg in batch:
+            self.send_latency.add(now - msg.due)
+        
+        self.sent += len(batch)
+    
+    def wake(self):
+        with self._cond:
+            self._interrupted = True
+            self._cond.notify_all()
+        
+        self._ready_callback()
+    
+    def clear(self):
+        with self._cond:
+            self._ready.clear()
+            self._delayed.clear()
+            self._pending_keys.clear()
+            self.depth = 0
+    
+    def metrics(self):
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "send_latency_mean": self.send_latency.mean(),
+            "send_latency_max": self.send_latency.max,
+        }
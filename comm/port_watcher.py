@@ -0,0 +1,169 @@
+import os
+import time
+import asyncio
+import threading
+from typing import Callable
+from dataclasses import dataclass
+
+from serial.tools.list_ports import comports
+
+from comm.async_loop import AsyncLoopThread, get_io_loop
+
+
+@dataclass(frozen=True)
+class PortInfo:
+    device: str
+    name: str
+    description: str = ""
+    vid: int | None = None
+    pid: int | None = None
+    serial_number: str | None = None
+    
+    @property
+    def identity(self):
+        # Survives the port being renumbered (ttyUSB0 -> ttyUSB1, COM3 -> COM5) when it is replugged
+        return (self.vid, self.pid, self.serial_number) if self.vid is not None else None
+
+
+def list_ports():
+    return [PortInfo(port.device, port.name, port.description or "", port.vid, port.pid, port.serial_number) for port in comports()]
+
+
+class PortWatcher:
+    # Device nodes come and go here, their mtime changing is far cheaper to check than enumerating ports
+    WATCH_PATHS = ("/dev", "/sys/class/tty")
+    
+    def __init__(self, io_loop: AsyncLoopThread, interval: float = 0.5, full_scan_interval: float = 3.0, settle: float = 1.0):
+        self.io_loop = io_loop
+        self.interval = interval
+        self.full_scan_interval = full_scan_interval
+        self.settle = settle
+        
+        # Called from the IO thread, listeners with the port name list whenever it changes, plug listeners with a known scanner's port
+        self.listeners: list[Callable[[list[str]], None]] = []
+        self.plug_listeners: list[Callable[[PortInfo], None]] = []
+        
+        self.known: set[tuple] = set()
+        self.scans = 0
+        self.running = False
+        
+        self._ports: dict[str, PortInfo] = {}
+        self._scanned = False
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+    
+    def add_listener(self, listener: Callable[[list[str]], None]):
+        self.listeners.append(listener)
+    
+    def add_plug_listener(self, listener: Callable[[PortInfo], None]):
+        self.plug_listeners.append(listener)
+    
+    def _signature(self):
+        signature = []
+        
+        for path in self.WATCH_PATHS:
+            try:
+                signature.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                pass
+        
+        return tuple(signature) or None
+    
+    def _update(self, ports: list[PortInfo]):
+        with self._lock:
+            previous = self._ports
+            self._ports = {port.device: port for port in ports}
+            self._scanned = True
+            self.scans += 1
+        
+        # A node can show up before udev has filled in its USB details, so a port counts as plugged once its identity is known
+        plugged = [
+            port for port in ports
+            if port.identity in self.known and (port.device not in previous or previous[port.device].identity != port.identity)
+        ]
+        
+        if previous.keys() != self._ports.keys():
+            names = self.ports()
+            
+            for listener in self.listeners:
+                listener(names)
+        
+        for port in plugged:
+            for listener in self.plug_listeners:
+                listener(port)
+    
+    def scan(self):
+        self._update(list_ports())
+    
+    def ports(self):
+        if not self._scanned:
+            self.scan()
+        
+        with self._lock:
+            return sorted(port.name for port in self._ports.values())
+    
+    def port_info(self, port: str):
+        with self._lock:
+            return next((info for info in self._ports.values() if port in (info.device, info.name)), None)
+    
+    def remember(self, port: str):
+        info = self.port_info(port)
+        
+        if info is not None and info.identity is not None:
+            self.known.add(info.identity)
+    
+    async def _watch(self):
+        loop = asyncio.get_running_loop()
+        
+        last_signature = None
+        last_scan = 0.0
+        rescan_at = None
+        
+        while True:
+            signature = self._signature()
+            now = time.monotonic()
+            
+            # Without a watchable /dev (Windows) the list is rebuilt on a slow timer instead
+            changed = signature != last_signature if signature is not None else now - last_scan >= self.full_scan_interval
+            
+            if changed or (rescan_at is not None and now >= rescan_at):
+                rescan_at = now + self.settle if changed else None
+                last_signature = signature
+                last_scan = now
+                
+                self._update(await loop.run_in_executor(None, list_ports))
+            
+            await asyncio.sleep(self.interval)
+    
+    async def _start(self):
+        if self.running:
+            return
+        
+        self.running = True
+        self._task = asyncio.get_running_loop().create_task(self._watch())
+    
+    async def _stop(self):
+        if not self.running:
+            return
+        
+        self.running = False
+        self._task.cancel()
+    
+    def start(self):
+        return self.io_loop.submit(self._start())
+    
+    def stop(self):
+        return self.io_loop.submit(self._stop())
+
+
+_PORT_WATCHER: PortWatcher | None = None
+_PORT_WATCHER_LOCK = threading.Lock()
+
+def get_port_watcher():
+    global _PORT_WATCHER
+    
+    with _PORT_WATCHER_LOCK:
+        if _PORT_WATCHER is None:
+            _PORT_WATCHER = PortWatcher(get_io_loop())
+    
+    return _PORT_WATCHER
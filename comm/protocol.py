@@ -0,0 +1,75 @@
+"Name:Variable-Type(Data)|...|..."
+
+class ProtocolError(ValueError):
+    pass
+
+
+def _parse_list(data: str):
+    if not data.strip():
+        return []
+    
+    return [float(item) for item in data.split(",")]
+
+
+class FrameParser:
+    def __init__(self):
+        # Type tag -> converter, a missing tag is a malformed frame
+        self.converters = {
+            "s": None,
+            "n": float,
+            "l": _parse_list
+        }
+        
+        self.rejected = 0
+    
+    def _reject(self, msg: str):
+        self.rejected += 1
+        
+        return ProtocolError(msg)
+    
+    def parse(self, text: str, out: dict | None = None):
+        if out is None:
+            out = {}
+        else:
+            out.clear()
+        
+        converters = self.converters
+        
+        for field in text.removesuffix("|").split("|"):
+            name, sep, value = field.partition(":")
+            value = value.strip()
+            
+            if not sep or value[1:2] != "(" or value[-1:] != ")":
+                raise self._reject(f"Malformed field {field!r} in frame {text!r}")
+            
+            var_type = value[0]
+            
+            if var_type not in converters:
+                raise self._reject(f"Type: ({var_type}) is not a valid type")
+            
+            converter = converters[var_type]
+            data = value[2:-1]
+            
+            if converter is not None:
+                try:
+                    data = converter(data)
+                except ValueError:
+                    raise self._reject(f"Bad {var_type} value for {name.strip()}: {data!r}") from None
+            
+            out[name.strip()] = data
+        
+        return out
+
+
+def encode_value(value: str | float | int | list):
+    if isinstance(value, str):
+        return f"s({value})"
+    elif isinstance(value, (list, tuple)):
+        return f"l({",".join(str(v) for v in value)})"
+    elif isinstance(value, (int, float)):
+        return f"n({value})"
+    
+    raise ProtocolError(f"Type: {type(value)} cannot be encoded")
+
+def encode_frame(fields: dict[str, str | float | int | list]):
+    return "|".join(f"{name}:{encode_value(value)}" for name, value in fields.items())
@@ -0,0 +1,114 @@
+import asyncio
+import os
+from itertools import count
+from typing import Callable, Literal
+
+from comm.async_loop import AsyncLoopThread
+from comm.framing import BINARY_CAPABILITY, frame_mode_from_echo
+from comm.transports import StreamTransport
+
+
+def parse_address(address: str):
+    # "unix:/run/cdsse.sock" for a Unix domain socket, "host:port" or ":port" for TCP
+    if address.startswith("unix:"):
+        return "unix", address[5:], None
+    
+    host, port = address.rsplit(":", 1)
+    
+    return "tcp", host or "0.0.0.0", int(port)
+
+
+class ScannerServer:
+    def __init__(self, io_loop: AsyncLoopThread, pswd: str, address: str, on_client: Callable[[str, StreamTransport, Literal["text", "binary"]], None], allow_binary: bool = True, handshake_timeout: float = 3.0):
+        self.io_loop = io_loop
+        self.pswd = pswd
+        self.address = address
+        self.on_client = on_client
+        self.allow_binary = allow_binary
+        self.handshake_timeout = handshake_timeout
+        
+        self.server: asyncio.AbstractServer | None = None
+        
+        self.accepted = 0
+        self.rejected = 0
+        self._client_ids = count(1)
+    
+    @property
+    def serving(self):
+        return self.server is not None and self.server.is_serving()
+    
+    def _peer_name(self, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        
+        if isinstance(peer, tuple):
+            return f"{peer[0]}:{peer[1]}"
+        
+        return f"unix#{next(self._client_ids)}"
+    
+    async def _handshake(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write((self.pswd + "\n").encode())
+        await writer.drain()
+        
+        response = await asyncio.wait_for(reader.readline(), self.handshake_timeout)
+        frame_mode = frame_mode_from_echo(self.pswd, response.decode().strip())
+        
+        if frame_mode == "binary":
+            if not self.allow_binary:
+                return "text"
+            
+            writer.write((BINARY_CAPABILITY + "\n").encode())
+        
+        return frame_mode
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        handed_over = False
+        
+        try:
+            try:
+                frame_mode = await self._handshake(reader, writer)
+            except (asyncio.TimeoutError, ValueError, ConnectionError):
+                # ValueError covers undecodable echoes and readline overruns
+                frame_mode = None
+            
+            if frame_mode is None:
+                self.rejected += 1
+                return
+            
+            self.accepted += 1
+            self.on_client(self._peer_name(writer), StreamTransport(reader, writer, self.io_loop), frame_mode)
+            
+            handed_over = True
+        finally:
+            # Until the client is handed over the stream is ours to close, whatever went wrong
+            if not handed_over:
+                writer.close()
+    
+    async def _start(self):
+        kind, host, port = parse_address(self.address)
+        
+        if kind == "unix":
+            if os.path.exists(host):
+                os.remove(host)
+            
+            self.server = await asyncio.start_unix_server(self._handle, host)
+        else:
+            self.server = await asyncio.start_server(self._handle, host, port)
+        
+        return [sock.getsockname() for sock in self.server.sockets]
+    
+    async def _stop(self):
+        if self.server is not None:
+            # Only stops accepting, clients already handed over are closed by their own comm systems
+            self.server.close()
+            self.server = None
+            
+            kind, path, _ = parse_address(self.address)
+            
+            if kind == "unix" and os.path.exists(path):
+                os.remove(path)
+    
+    def start(self):
+        return self.io_loop.submit(self._start())
+    
+    def stop(self):
+        return self.io_loop.submit(self._stop())
@@ -0,0 +1,295 @@
+"""Stand-in attendance scanner for throughput and latency runs without hardware
+
+Run from the project root:
+    python -m comm.simulator --pty                          prints a serial port to point the app at (-g=/dev/pts/N:9600)
+    python -m comm.simulator --connect :5050 --clients 4    dials into a running scanner server (-s=:5050)
+
+Scans are replayed at --rate scans/s, shaped as steady, poisson or burst. Latency is measured from a scan
+being written to the app's status reply for it (SCANNED, UNSCANNED, UNREGISTERED)
+
+The app drops an IUD repeated inside its dedup window (-dw, 2 s by default) without replying, so no IUD is
+scanned again inside --dedup-window and the wait is stretched when every IUD was scanned too recently. Replies
+hold no IUD and are paired with scans in order, a scan left unanswered past --timeout is counted as dropped
+"""
+
+import os
+import sys
+import json
+import time
+import tty
+import pickle
+import random
+import asyncio
+import argparse
+from collections import deque
+from typing import Iterator, Literal
+
+from comm.framing import BinaryFramer, LineFramer, BINARY_CAPABILITY, encode_binary_frame, decode_binary_payload
+from comm.message_queue import STATUS_CODES
+from comm.protocol import encode_frame
+from comm.server import parse_address
+
+DEFAULT_KEY = "83ab579eee7f8a98c765"
+
+# Replies the app sends for a scan it has processed, REGISTERED answers the card assignment screen instead
+SCAN_REPLIES = STATUS_CODES - {"REGISTERED", "SCANNING"}
+
+# Kept on top of the dedup window, the app times repeats from when they arrive, not from when they were sent
+WINDOW_MARGIN = 0.1
+
+
+def load_iuds(path: str):
+    if path.endswith(".json"):
+        with open(path) as file:
+            return list(dict.fromkeys(_find_iuds(json.load(file))))
+    elif path.endswith(".cdat"):
+        with open(path, "rb") as file:
+            data = pickle.load(file)
+        
+        return [staff.IUD for staff in list(data.prefects.values()) + list(data.teachers.values()) if staff.IUD]
+    
+    with open(path) as file:
+        # Plain IUD per line, or the "kb <key>, <IUD>" rows of src/dbg.txt
+        return [line.split(",")[-1].strip() for line in file if line.strip()]
+
+def _find_iuds(node):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "IUD" and isinstance(value, str) and value:
+                yield value
+            else:
+                yield from _find_iuds(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _find_iuds(value)
+
+
+def scan_schedule(iuds: list[str], rate: float, shape: Literal["steady", "poisson", "burst"] = "steady", burst: int = 10, gap: float = 1.0, count: int = 0, seed: int | None = None, window: float = 0.0) -> Iterator[tuple[float, str]]:
+    # Yields (seconds to wait before the scan, IUD), count 0 runs until stopped. An IUD is not repeated inside window seconds
+    rng = random.Random(seed)
+    interval = 1 / rate
+    sent = 0
+    
+    clock = 0.0
+    last_scanned: dict[str, float] = {}
+    
+    while not count or sent < count:
+        if not sent:
+            delay = 0.0
+        elif shape == "poisson":
+            delay = rng.expovariate(rate)
+        elif shape == "burst":
+            delay = gap if sent % burst == 0 else interval
+        else:
+            delay = interval
+        
+        clock += delay
+        ready = [iud for iud in iuds if iud not in last_scanned or clock - last_scanned[iud] >= window]
+        
+        if not ready:
+            # Every IUD is still inside the window, wait for the one that leaves it first
+            iud = min(iuds, key=last_scanned.__getitem__)
+            
+            delay += last_scanned[iud] + window - clock
+            clock = last_scanned[iud] + window
+            ready = [iud]
+        
+        iud = rng.choice(ready)
+        last_scanned[iud] = clock
+        
+        yield delay, iud
+        sent += 1
+
+
+def percentile(values: list[float], pct: float):
+    if not values:
+        return 0.0
+    
+    values = sorted(values)
+    
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class ScannerSimulator:
+    def __init__(self, iuds: list[str], pswd: str = DEFAULT_KEY, binary: bool = False, timeout: float = 2.0, **schedule):
+        assert iuds, "No IUDs to scan"
+        
+        self.iuds = iuds
+        self.pswd = pswd
+        self.binary = binary
+        self.timeout = timeout
+        self.schedule = schedule
+        
+        self.sent = 0
+        self.replies = 0
+        self.dropped = 0
+        self.other_replies = 0
+        self.latencies: list[float] = []
+        
+        self.started: float | None = None
+        self.finished: float | None = None
+    
+    async def _handshake(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # The host repeats the password until it hears back, only the first one is answered
+        while (await reader.readline()).decode(errors="replace").strip() != self.pswd:
+            pass
+        
+        writer.write((self.pswd + (BINARY_CAPABILITY if self.binary else "") + "\n").encode())
+        await writer.drain()
+        
+        if self.binary:
+            while (await reader.readline()).decode(errors="replace").strip() != BINARY_CAPABILITY:
+                pass
+    
+    def _encode_scan(self, iud: str):
+        if self.binary:
+            return encode_binary_frame({"IUD": iud})
+        
+        return (encode_frame({"IUD": iud}) + "\n").encode()
+    
+    def _decode_reply(self, frame: bytearray):
+        if self.binary:
+            return str(decode_binary_payload(frame).get("msg", ""))
+        
+        return frame.decode(errors="replace")
+    
+    async def _send_scans(self, writer: asyncio.StreamWriter, pending: deque[float]):
+        for delay, iud in scan_schedule(self.iuds, **self.schedule):
+            if delay:
+                await asyncio.sleep(delay)
+            
+            writer.write(self._encode_scan(iud))
+            pending.append(time.perf_counter())
+            self.sent += 1
+            
+            await writer.drain()
+    
+    async def _read_replies(self, reader: asyncio.StreamReader, pending: deque[float]):
+        framer = BinaryFramer() if self.binary else LineFramer()
+        
+        while chunk := await reader.read(4096):
+            now = time.perf_counter()
+            
+            for frame in framer.feed(chunk):
+                reply = self._decode_reply(frame).strip()
+                
+                # Scans that went unanswered too long were dropped, a later reply is not theirs
+                while pending and now - pending[0] > self.timeout:
+                    pending.popleft()
+                    self.dropped += 1
+                
+                if reply in SCAN_REPLIES and pending:
+                    # The app answers scans in arrival order, so the oldest unanswered scan is this one
+                    self.latencies.append(now - pending.popleft())
+                    self.replies += 1
+                else:
+                    self.other_replies += 1
+    
+    async def session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, linger: float = 2.0):
+        await self._handshake(reader, writer)
+        
+        pending: deque[float] = deque()
+        replies = asyncio.create_task(self._read_replies(reader, pending))
+        
+        self.started = self.started or time.perf_counter()
+        
+        try:
+            await self._send_scans(writer, pending)
+            
+            # Give the app time to answer what is still in flight
+            deadline = time.perf_counter() + linger
+            while pending and time.perf_counter() < deadline and not replies.done():
+                await asyncio.sleep(0.01)
+        finally:
+            self.finished = time.perf_counter()
+            replies.cancel()
+            writer.close()
+            
+            self.dropped += len(pending)
+    
+    def report(self):
+        elapsed = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        ms = [latency * 1000 for latency in self.latencies]
+        
+        return (
+            f"sent {self.sent} scans, {self.replies} answered, {self.dropped} dropped unanswered ({self.other_replies} other replies) in {elapsed:.2f}s\n"
+            f"throughput {self.replies / elapsed if elapsed else 0:,.1f} scans/s\n"
+            f"latency ms  p50 {percentile(ms, 50):.2f}  p95 {percentile(ms, 95):.2f}  p99 {percentile(ms, 99):.2f}  max {max(ms, default=0):.2f}"
+        )
+
+
+async def open_pty():
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    
+    loop = asyncio.get_running_loop()
+    
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(master, "rb", 0))
+    
+    transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, os.fdopen(os.dup(master), "wb", 0))
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    
+    # The slave end stays open here so the port keeps existing while the app reopens it
+    return os.ttyname(slave), reader, writer
+
+async def open_client(address: str):
+    kind, host, port = parse_address(address)
+    
+    if kind == "unix":
+        return await asyncio.open_unix_connection(host)
+    
+    return await asyncio.open_connection("127.0.0.1" if host == "0.0.0.0" else host, port)
+
+
+async def run(args: argparse.Namespace):
+    iuds = load_iuds(args.data)
+    schedule = {"rate": args.rate, "shape": args.shape, "burst": args.burst, "gap": args.gap, "count": args.count, "seed": args.seed, "window": args.dedup_window + WINDOW_MARGIN if args.dedup_window > 0 else 0.0}
+    
+    simulator = ScannerSimulator(iuds, args.key, args.binary, args.timeout, **schedule)
+    
+    if args.pty:
+        name, reader, writer = await open_pty()
+        print(f"Simulated scanner on {name}, {len(iuds)} IUDs", flush=True)
+        
+        sessions = [simulator.session(reader, writer)]
+    else:
+        streams = [await open_client(args.connect) for _ in range(args.clients)]
+        print(f"{args.clients} simulated scanners connected to {args.connect}, {len(iuds)} IUDs", flush=True)
+        
+        sessions = [simulator.session(reader, writer) for reader, writer in streams]
+    
+    try:
+        await asyncio.gather(*sessions)
+    finally:
+        print(simulator.report())
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser(prog="python -m comm.simulator", description="Simulated attendance scanner")
+    
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--pty", action="store_true", help="expose a pseudo terminal serial port")
+    target.add_argument("--connect", metavar="ADDRESS", help="host:port or unix:/path of the app's scanner server")
+    
+    parser.add_argument("--data", default="src/default-data.json", help="json, .cdat or IUD per line file to take IUDs from")
+    parser.add_argument("--key", default=DEFAULT_KEY)
+    parser.add_argument("--binary", action="store_true", help="offer binary frames during the handshake")
+    parser.add_argument("--clients", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=5.0, help="scans per second per scanner")
+    parser.add_argument("--shape", choices=["steady", "poisson", "burst"], default="steady")
+    parser.add_argument("--burst", type=int, default=10, help="scans per burst")
+    parser.add_argument("--gap", type=float, default=1.0, help="seconds between bursts")
+    parser.add_argument("--count", type=int, default=100, help="scans per scanner, 0 for no limit")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--dedup-window", type=float, default=2.0, help="the app's -dw, seconds before an IUD is scanned again")
+    parser.add_argument("--timeout", type=float, default=2.0, help="seconds before an unanswered scan counts as dropped")
+    
+    try:
+        asyncio.run(run(parser.parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
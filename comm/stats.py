@@ -0,0 +1,75 @@
+import time
+
+
+class RateCounter:
+    def __init__(self, window: float = 1.0):
+        self.window = window
+        self.total = 0
+        
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._rate = 0.0
+    
+    def _roll(self, now: float):
+        elapsed = now - self._window_start
+        
+        if elapsed >= self.window:
+            # A window with no activity at all means the rate has dropped to zero
+            self._rate = self._window_count / elapsed if elapsed < self.window * 2 else 0.0
+            self._window_start = now
+            self._window_count = 0
+    
+    def add(self, amount: int = 1):
+        self.total += amount
+        
+        self._roll(time.monotonic())
+        self._window_count += amount
+    
+    def rate(self):
+        self._roll(time.monotonic())
+        
+        return self._rate
+
+
+class LatencyStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+    
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        self.max = max(self.max, seconds)
+    
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class CommStats:
+    def __init__(self):
+        self.wakeups = RateCounter()
+        
+        self.bytes_in = RateCounter()
+        self.lines_in = RateCounter()
+        self.frames_dropped = RateCounter()
+        
+        self.bytes_out = RateCounter()
+        self.lines_out = RateCounter()
+        
+        # Byte arrival to the end of dispatch (signals emitted) for each chunk that completed a frame
+        self.ingest_latency = LatencyStats()
+    
+    def counters(self):
+        return {name: counter for name, counter in vars(self).items() if isinstance(counter, RateCounter)}
+    
+    def snapshot(self):
+        return {name: (counter.total, counter.rate()) for name, counter in self.counters().items()}
+    
+    def to_str(self):
+        lines = [f"{name}: {total} ({rate:.1f}/s)" for name, (total, rate) in self.snapshot().items()]
+        lines.append(f"ingest_latency: {self.ingest_latency.mean() * 1000:.2f} ms avg, {self.ingest_latency.max * 1000:.2f} ms max")
+        
+        return "\n".join(lines)
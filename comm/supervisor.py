@@ -0,0 +1,23 @@
+import random
+
+
+class Backoff:
+    def __init__(self, initial: float = 0.5, factor: float = 2.0, maximum: float = 10.0, jitter: float = 0.1, seed: int | None = None):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.jitter = jitter
+        
+        self.attempts = 0
+        
+        self._rng = random.Random(seed)
+    
+    def next(self):
+        delay = min(self.maximum, self.initial * self.factor ** self.attempts)
+        self.attempts += 1
+        
+        # Gates that dropped together (power blip, AP restart) should not all retry in lockstep
+        return delay * (1 + self._rng.uniform(-self.jitter, self.jitter))
+    
+    def reset(self):
+        self.attempts = 0
@@ -0,0 +1,332 @@
+import asyncio
+import threading
+import time
+from typing import Callable
+
+import serial
+from bleak import BleakClient
+
+from comm.stats import CommStats
+from comm.async_loop import AsyncLoopThread
+from comm.capture import CAPTURE_IN, CAPTURE_MODE, read_capture
+from comm.framing import LineFramer
+from comm.handshake import Handshake
+
+
+class BaseTransport:
+    def __init__(self):
+        self.stats = CommStats()
+        self.is_open = False
+        
+        # Called from the transport's own thread once it is able to carry frames
+        self.on_open: Callable[[], None] | None = None
+    
+    def open(self):
+        raise NotImplementedError()
+    
+    def close(self):
+        raise NotImplementedError()
+    
+    def write(self, data: bytes):
+        raise NotImplementedError()
+    
+    def run(self, on_data: Callable[[bytes], None]):
+        raise NotImplementedError()
+    
+    def clock(self):
+        # What the dedup window measures time with, a replay answers with the capture's own timestamps
+        return time.monotonic()
+
+
+class SerialTransport(BaseTransport):
+    def __init__(self, port: str, baud_rate: int, idle_timeout: float = 1.0, handshake_timeout: float = 1.0):
+        super().__init__()
+        
+        self.port = port
+        self.baud_rate = baud_rate
+        
+        # Reads return as soon as a byte arrives, the timeout only bounds how long an idle port sleeps
+        self.idle_timeout = idle_timeout
+        self.handshake_timeout = handshake_timeout
+        
+        self.serial: serial.Serial | None = None
+        self._running = False
+    
+    @property
+    def in_waiting(self):
+        return self.serial.in_waiting
+    
+    def open(self):
+        self.serial = serial.Serial(self.port, self.baud_rate, timeout=self.handshake_timeout)
+        self.is_open = True
+    
+    def close(self):
+        self.is_open = False
+        
+        if self.serial is None:
+            return
+        
+        if self._running:
+            # The reader thread owns the port while running, wake it so it can close it
+            self.serial.cancel_read()
+        else:
+            self.serial.close()
+    
+    def readline(self):
+        return self.serial.readline()
+    
+    def handshake(self, handshake: Handshake):
+        # Returns whatever the device sent after its echo, it belongs to the data stream
+        framer = LineFramer()
+        
+        self.write(handshake.start())
+        
+        while not handshake.done:
+            self.serial.timeout = handshake.wait_time()
+            chunk = self.serial.read(self.serial.in_waiting or 1)
+            
+            lines = framer.feed(chunk) if chunk else []
+            
+            for i, line in enumerate(lines):
+                reply = handshake.on_line(line.decode(errors="replace"))
+                
+                if reply is not None:
+                    self.write(reply)
+                
+                if handshake.done:
+                    return b"".join(rest + b"\n" for rest in lines[i + 1:]) + framer.flush()
+            
+            probe = handshake.poll()
+            
+            if probe is not None:
+                self.write(probe)
+        
+        return b""
+    
+    def write(self, data: bytes):
+        self.serial.write(data)
+        self.stats.bytes_out.add(len(data))
+    
+    def run(self, on_data: Callable[[bytes], None]):
+        self._running = True
+        self.serial.timeout = self.idle_timeout
+        
+        try:
+            while self.is_open:
+                # Blocks on port readiness (select on POSIX, overlapped wait on Windows)
+                chunk = self.serial.read(self.serial.in_waiting or 1)
+                
+                self.stats.wakeups.add()
+                
+                if chunk:
+                    self.stats.bytes_in.add(len(chunk))
+                    on_data(chunk)
+        finally:
+            self._running = False
+            self.serial.close()
+
+
+class BLETransport(BaseTransport):
+    def __init__(self, addr: str, io_loop: AsyncLoopThread, write_timeout: float = 5.0):
+        super().__init__()
+        
+        self.addr = addr
+        self.io_loop = io_loop
+        self.write_timeout = write_timeout
+        
+        self.client: BleakClient | None = None
+        self.write_char = None
+        self.notify_char = None
+        self.write_with_response = True
+        
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._closed: asyncio.Event | None = None
+    
+    @property
+    def chunk_size(self):
+        # ATT header takes 3 bytes of every packet
+        return max(20, self.client.mtu_size - 3) if self.client is not None else 20
+    
+    def _find_characteristics(self):
+        for service in self.client.services:
+            for char in service.characteristics:
+                if self.write_char is None and ("write" in char.properties or "write-without-response" in char.properties):
+                    self.write_char = char
+                
+                if self.notify_char is None and ("notify" in char.properties or "indicate" in char.properties):
+                    self.notify_char = char
+        
+        assert self.write_char is not None, "No writable characteristic found on device."
+        assert self.notify_char is not None, "No notifying characteristic found on device."
+        
+        self.write_with_response = "write-without-response" not in self.write_char.properties
+    
+    def _disconnected(self, _):
+        if self._closed is not None:
+            self._closed.set()
+    
+    async def _run(self, on_data: Callable[[bytes], None]):
+        self._loop = asyncio.get_running_loop()
+        self._closed = asyncio.Event()
+        
+        def notified(_, data: bytearray):
+            self.stats.wakeups.add()
+            self.stats.bytes_in.add(len(data))
+            
+            # Notifications carry at most one MTU, the framer reassembles frames split across them
+            on_data(bytes(data))
+        
+        async with BleakClient(self.addr, disconnected_callback=self._disconnected) as client:
+            self.client = client
+            self._find_characteristics()
+            
+            await client.start_notify(self.notify_char, notified)
+            
+            self.is_open = True
+            
+            if self.on_open is not None:
+                self.on_open()
+            
+            await self._closed.wait()
+            
+            if client.is_connected:
+                await client.stop_notify(self.notify_char)
+        
+        if self.is_open:
+            self.is_open = False
+            raise ConnectionError(f"BLE device {self.addr} disconnected")
+    
+    def run(self, on_data: Callable[[bytes], None]):
+        # The session lives on the shared IO loop, the calling thread only waits for it to end
+        self.io_loop.submit(self._run(on_data)).result()
+    
+    def close(self):
+        self.is_open = False
+        
+        if self._loop is not None and self._closed is not None:
+            self._loop.call_soon_threadsafe(self._closed.set)
+    
+    async def _write(self, data: bytes):
+        size = self.chunk_size
+        
+        for i in range(0, len(data), size):
+            await self.client.write_gatt_char(self.write_char, data[i:i + size], response=self.write_with_response)
+    
+    def write(self, data: bytes):
+        asyncio.run_coroutine_threadsafe(self._write(data), self._loop).result(self.write_timeout)
+        self.stats.bytes_out.add(len(data))
+
+
+class StreamTransport(BaseTransport):
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, io_loop: AsyncLoopThread, chunk_size: int = 4096):
+        super().__init__()
+        
+        self.reader = reader
+        self.writer = writer
+        self.io_loop = io_loop
+        self.chunk_size = chunk_size
+        
+        # The server hands the stream over after the handshake, it is already able to carry frames
+        self.is_open = True
+    
+    def open(self):
+        pass
+    
+    def close(self):
+        self.is_open = False
+        self.io_loop.call_soon(self.writer.close)
+    
+    def write(self, data: bytes):
+        # StreamWriter is not thread safe, the bytes are handed to the loop that owns it
+        self.io_loop.call_soon(self.writer.write, data)
+        self.stats.bytes_out.add(len(data))
+    
+    async def write_async(self, data: bytes):
+        # From a task on the IO loop, waits while the client is slow to read instead of buffering without bound
+        self.writer.write(data)
+        self.stats.bytes_out.add(len(data))
+        
+        await self.writer.drain()
+    
+    async def _run(self, on_data: Callable[[bytes], None]):
+        if self.on_open is not None:
+            self.on_open()
+        
+        try:
+            while self.is_open:
+                chunk = await self.reader.read(self.chunk_size)
+                
+                if not chunk:
+                    break
+                
+                self.stats.wakeups.add()
+                self.stats.bytes_in.add(len(chunk))
+                
+                on_data(chunk)
+        finally:
+            self.is_open = False
+            self.writer.close()
+    
+    def start(self, on_data: Callable[[bytes], None]):
+        # Every client is a task on the shared IO loop, no thread is parked on its reads
+        return self.io_loop.submit(self._run(on_data))
+    
+    def run(self, on_data: Callable[[bytes], None]):
+        self.start(on_data).result()
+
+
+class ReplayTransport(BaseTransport):
+    def __init__(self, path: str, speed: float = 1.0):
+        super().__init__()
+        
+        self.path = path
+        # 1.0 replays in real time, 0 as fast as the pipeline can take it
+        self.speed = speed
+        
+        self.on_mode: Callable[[str], None] | None = None
+        self._closed = threading.Event()
+        
+        # Capture timestamp of the chunk being handed over, at any speed the dedup window sees the recorded timing
+        self._now = 0.0
+    
+    def open(self):
+        self.is_open = True
+    
+    def close(self):
+        self.is_open = False
+        self._closed.set()
+    
+    def write(self, data: bytes):
+        # Replies have nowhere to go, they are only counted
+        self.stats.bytes_out.add(len(data))
+    
+    def clock(self):
+        return self._now
+    
+    def run(self, on_data: Callable[[bytes], None]):
+        if self.on_open is not None:
+            self.on_open()
+        
+        start = time.perf_counter()
+        
+        for t, kind, data in read_capture(self.path):
+            if not self.is_open:
+                break
+            
+            if self.speed > 0:
+                wait = start + t / self.speed - time.perf_counter()
+                
+                if wait > 0 and self._closed.wait(wait):
+                    break
+            
+            if kind == CAPTURE_MODE:
+                if self.on_mode is not None:
+                    self.on_mode(data.decode())
+            elif kind == CAPTURE_IN:
+                self._now = t
+                self.stats.wakeups.add()
+                self.stats.bytes_in.add(len(data))
+                
+                on_data(data)
+        
+        self.is_open = False
@@ -2,10 +2,25 @@
 from imports import *
 from functions_and_uncategorized import Thread
 
+from comm.framing import LineFramer, BinaryFramer, encode_binary_frame, decode_binary_payload
+from comm.async_loop import get_io_loop
+from comm.capture import CaptureWriter, CAPTURE_IN, CAPTURE_OUT, CAPTURE_MODE
+from comm.batching import IngestBuffer
+from comm.dedup import ScanDeduplicator
+from comm.discovery import get_ble_discovery
+from comm.dispatch import DataDispatcher
+from comm.handshake import Handshake, PasswordException
+from comm.latency import get_latency_tracker
+from comm.message_queue import OutboundQueue
+from comm.port_watcher import get_port_watcher
+from comm.protocol import FrameParser, ProtocolError
+from comm.server import ScannerServer
+from comm.supervisor import Backoff
+from comm.transports import BaseTransport, SerialTransport, BLETransport, StreamTransport, ReplayTransport
+
 "Name:Variable-Type(Data)|...|..."
 
-class PasswordException(Exception):
-    pass
+DEVICE_KEY = "83ab579eee7f8a98c765"
 
 @dataclass
 class CommDevice:
@@ -16,25 +31,53 @@ class CommDevice:
     addr: str | None = None
     baud_rate: int | None = None
     pswd: str | None = None
+    allow_binary: bool = True
+    dedup_window: float = 2.0
 
 class BaseCommSystem:
     def __init__(self, device: CommDevice, error_func: Callable[[Exception], None]):
         self.device = device
         self.error_func = error_func
-        self.ble_scanner = BleakScanner()
         
-        self.msg_buffer = []
+        self.io_loop = get_io_loop()
+        self.ble_discovery = get_ble_discovery()
+        self.port_watcher = get_port_watcher()
+        
+        self.msg_queue = OutboundQueue()
+        
+        self.transport: BaseTransport | None = None
+        self.parser = FrameParser()
+        
+        self.frame_mode: Literal["text", "binary"] = "text"
+        self._framer: LineFramer | BinaryFramer = LineFramer()
         
         self.connected = False
         
+        # Once a link has been up, losing it is retried in the background instead of reported
+        self.auto_reconnect = True
+        self.reconnecting = False
+        self.reconnects = 0
+        self.backoff = Backoff()
+        self._stopped = threading.Event()
+        
         self.connection_message = ""
-        self.data_points: list[tuple[int | str | list[str], pyBoundSignal]] = []
+        self.handshake_latency = 0.0
+        self.dispatcher = DataDispatcher()
+        self.deduplicator = ScanDeduplicator(self.device.dedup_window)
+        
+        self.tracker = get_latency_tracker()
+        self._frame_arrival: float | None = None
         
         self.direct_signal = self.device.data_signal
         self.connection_changed_signal = self.device.connection_changed
         
         self.serial_mode = False
         self.bluetooth_mode = False
+        
+        self.capture: CaptureWriter | None = None
+        
+        self.replay_path: str | None = None
+        self.replay_speed = 1.0
     
     def set_bluetooth(self, a0: bool):
         self.bluetooth_mode = a0
@@ -42,167 +85,502 @@ class BaseCommSystem:
     def set_serial(self, a0: bool):
         self.serial_mode = a0
     
-    def set_data_point(self, key: int | str | list[str], signal: pyBoundSignal):
-        if isinstance(key, str):
-            self.data_points.append((key, signal))
-        elif isinstance(key, (list, set, tuple)):
-            self.data_points.append((list[key], signal))
-        else:
-            raise Exception(f"Bad key type: {type(key)}")
+    def set_replay(self, path: str | None, speed: float = 1.0):
+        self.replay_path = path
+        self.replay_speed = speed
     
-    def send_message(self, msg: str):
-        if self.connected:
-            self.msg_buffer.append(msg)
+    def start_capture(self, path: str):
+        self.stop_capture()
+        
+        self.capture = CaptureWriter(path)
+        self.capture.record(CAPTURE_MODE, self.frame_mode.encode())
+    
+    def stop_capture(self):
+        if self.capture is not None:
+            self.capture.close()
+            self.capture = None
+    
+    def set_data_point(self, key: str | list[str], signal: pyBoundSignal):
+        self.dispatcher.subscribe(key, signal)
+    
+    @property
+    def stats(self):
+        return self.transport.stats if self.transport is not None else None
+    
+    def set_frame_mode(self, mode: Literal["text", "binary"]):
+        self.frame_mode = mode
+        self._framer = BinaryFramer() if mode == "binary" else LineFramer()
+        
+        if self.capture is not None:
+            self.capture.record(CAPTURE_MODE, mode.encode())
+    
+    def send_message(self, msg: str, priority: int | None = None, delay: float = 0.0):
+        # Messages sent while the link is being restored go out once it is back
+        if self.connected or self.reconnecting:
+            trace = self.tracker.current
+            
+            self.msg_queue.put(msg, priority, delay, trace=trace)
+            self.tracker.stamp(trace, "reply_enqueued")
     
     def start_connection(self):
-        if self.connected:
+        if self.connected or self.reconnecting:
             raise Exception("Comm device already connected")
         
-        self.connection_thread = Thread(self._connect)
+        self._stopped.clear()
+        self.backoff.reset()
+        
+        self.connection_thread = Thread(self._supervise)
         self.connection_thread.crashed.connect(self._crashed)
         self.connection_thread.start()
     
+    def attach(self, transport: StreamTransport, frame_mode: Literal["text", "binary"]):
+        # Network scanners dial in already past the handshake, there is nothing left to connect
+        self.transport = transport
+        self.set_frame_mode(frame_mode)
+        self.dispatcher.reset()
+        
+        self._set_connected()
+        
+        # Replies are written by a task on the same loop, a client costs no thread at all
+        self.io_loop.submit(self._write_task(transport))
+        
+        session = transport.start(self._on_data)
+        session.add_done_callback(self._detached)
+        
+        return session
+    
+    def _detached(self, _):
+        if self.connected:
+            self.stop_connection()
+    
     def stop_connection(self):
+        self._stopped.set()
+        
         self.connected = False
+        self.reconnecting = False
+        self.msg_queue.wake()
+        self.msg_queue.clear()
+        
+        if self.transport is not None:
+            self.transport.close()
+        
         self.device.connection_changed.emit(self.connected)
     
     def find_devices(self, key: str):
         if key == "ser":
-            return [port.name for port in comports()]
+            # Kept current by the watcher, reading it costs nothing
+            return self.port_watcher.ports()
         elif key == "bt":
-            return [(bl_info.address, bl_info.name) for bl_info in asyncio.run(self.ble_scanner.discover())]
+            # Discovery keeps running in the background, this only reads what it has seen so far
+            self.ble_discovery.start()
+            
+            return self.ble_discovery.devices()
     
     def _init_process_data(self, data: bytes):
         return data.decode().strip().removesuffix("|").strip()
     
+    def _on_data(self, chunk: bytes):
+        arrival = time.perf_counter()
+        
+        if self.capture is not None:
+            self.capture.record(CAPTURE_IN, chunk, arrival)
+        
+        self._frame_arrival = arrival
+        
+        dropped = self._framer.dropped
+        frames = self._framer.feed(chunk)
+        
+        if self._framer.dropped != dropped:
+            self.transport.stats.frames_dropped.add(self._framer.dropped - dropped)
+        
+        if frames:
+            self.transport.stats.lines_in.add(len(frames))
+        
+        for frame in frames:
+            # A bad frame is dropped and counted, it must not take the connection down with it
+            try:
+                if self.frame_mode == "binary":
+                    self._dispatch(decode_binary_payload(frame))
+                else:
+                    msg_recv = self._init_process_data(frame)
+                    
+                    if msg_recv:
+                        self._data_process(msg_recv)
+            except (ProtocolError, UnicodeDecodeError):
+                self.transport.stats.frames_dropped.add()
+        
+        if frames:
+            self.transport.stats.ingest_latency.add(time.perf_counter() - arrival)
+    
+    def _encode_outbound(self, texts: list[str]):
+        if self.frame_mode == "binary":
+            return b"".join(encode_binary_frame({"msg": text}) for text in texts)
+        
+        return "".join(text + "\n" for text in texts).encode()
+    
+    def _write_loop(self, transport: BaseTransport):
+        while self.connected:
+            batch = self.msg_queue.get_batch()
+            
+            if not batch:
+                continue
+            
+            if not self.connected:
+                # The link dropped while the batch was being taken, it waits for the next one
+                self._requeue(batch)
+                return
+            
+            # One write per batch, the device reads them back as separate frames
+            data = self._encode_outbound([msg.text for msg in batch])
+            
+            try:
+                transport.write(data)
+            except Exception:
+                # The link went down under the write, the batch waits for the next one
+                self._requeue(batch)
+                return
+            
+            self._written(transport, batch, data)
+    
+    async def _write_task(self, transport: StreamTransport):
+        # _write_loop for network clients, waiting on the IO loop instead of in a thread of its own
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        
+        self.msg_queue.on_ready = lambda: loop.call_soon_threadsafe(ready.set)
+        
+        try:
+            while self.connected:
+                ready.clear()
+                batch = self.msg_queue.get_batch(0)
+                
+                if not batch:
+                    try:
+                        await asyncio.wait_for(ready.wait(), self.msg_queue.next_due())
+                    except TimeoutError:
+                        pass
+                    
+                    continue
+                
+                if not self.connected:
+                    self._requeue(batch)
+                    return
+                
+                data = self._encode_outbound([msg.text for msg in batch])
+                
+                try:
+                    await transport.write_async(data)
+                except Exception:
+                    self._requeue(batch)
+                    return
+                
+                self._written(transport, batch, data)
+        finally:
+            self.msg_queue.on_ready = None
+    
+    def _written(self, transport: BaseTransport, batch: list, data: bytes):
+        transport.stats.lines_out.add(len(batch))
+        
+        for msg in batch:
+            self.tracker.stamp(msg.trace, "reply_written")
+        
+        if self.capture is not None:
+            self.capture.record(CAPTURE_OUT, data)
+        
+        self.msg_queue.mark_sent(batch)
+    
+    def _requeue(self, batch):
+        # A deliberate stop clears the queue, nothing goes back in after it
+        if not self._stopped.is_set():
+            self.msg_queue.requeue(batch)
+    
+    def _set_connected(self):
+        self.connected = True
+        self.reconnecting = False
+        self.connection_message = ""
+        
+        self.device.connection_changed.emit(self.connected)
+    
+    def _link_lost(self):
+        self.connected = False
+        self.reconnecting = True
+        self.msg_queue.wake()
+        
+        if self.transport is not None:
+            self.transport.close()
+        
+        self.device.connection_changed.emit(self.connected)
+    
+    def _supervise(self):
+        linked = False
+        
+        while True:
+            try:
+                self._connect()
+                error = None
+            except Exception as e:
+                error = e
+            
+            if self._stopped.is_set():
+                return
+            
+            if self.connected:
+                linked = True
+                self.backoff.reset()
+            
+            # A first connection that fails, or a device that is misconfigured, still goes to error_func
+            if not linked or not self.auto_reconnect or isinstance(error, AssertionError):
+                self.reconnecting = False
+                
+                if error is not None:
+                    raise error
+                
+                return
+            
+            self._link_lost()
+            
+            delay = self.backoff.next()
+            self.connection_message = f"Link lost ({error or 'closed'}), reconnecting in {delay:.1f}s"
+            
+            if self._stopped.wait(delay):
+                return
+            
+            self.reconnects += 1
+    
     def _crashed(self, e: Exception):
         self.connection_thread.quit()
         self.error_func(e)
     
     def _data_process(self, msg_recv: str):
-        full_data = self._process_data(msg_recv)
-        
-        data_key_mapping = {}
-        for key, info in full_data.items():
-            for d_k, d_signal in self.data_points:
-                if isinstance(d_k, str):
-                    if key == d_k:
-                        d_signal.emit(info)
-                        # break
-                elif isinstance(d_k, list):
-                    if key in d_k:
-                        if d_k not in data_key_mapping:
-                            data_key_mapping[d_k] = [None for _ in range(len(d_k))]
-                        data_key_mapping[d_k][d_k.index(key)] = info
-                        if None not in data_key_mapping[d_k]:
-                            d_signal.emit(data_key_mapping[d_k])
-                            # break
+        self._dispatch(self._process_data(msg_recv))
+    
+    def _dispatch(self, full_data: dict):
+        iud = full_data.get("IUD")
+        
+        # Receivers take the IUD as a str (signals, staff lookups), any other type is a malformed frame and is counted
+        # as a dropped one by _on_data
+        if iud is not None and not isinstance(iud, str):
+            raise ProtocolError(f"IUD must be a string, not {type(iud).__name__}")
+        
+        # Readers repeat a card held against them, the repeats never reach the GUI thread
+        if not self.deduplicator.accept(full_data, self.transport.clock()):
+            return
+        
+        trace = self.tracker.begin(iud, self._frame_arrival) if iud is not None else None
+        self.tracker.stamp(trace, "parsed")
+        
+        self.dispatcher.dispatch(full_data)
         
         self.direct_signal.emit(full_data)
+        self.tracker.stamp(trace, "emitted")
+    
+    def run_replay(self, on_open: Callable[[], None] | None = None):
+        # Recorded bytes go through the same framing, parsing and dispatch as live ones, returns once all are played
+        replay_target = ReplayTransport(self.replay_path, self.replay_speed)
+        replay_target.on_mode = self.set_frame_mode
+        replay_target.on_open = on_open
+        replay_target.open()
+        
+        self.transport = replay_target
+        self.set_frame_mode("text")
+        self.dispatcher.reset()
+        self.deduplicator.reset()
+        
+        replay_target.run(self._on_data)
     
     def _connect(self):
-        if self.serial_mode:
+        if self.replay_path is not None:
+            def opened():
+                self._set_connected()
+                
+                writer = threading.Thread(target=self._write_loop, args=(self.transport,), daemon=True)
+                writer.start()
+            
+            self.run_replay(opened)
+            self.stop_connection()
+        elif self.serial_mode:
             assert self.device.baud_rate is not None, "Invalid device"
             
-            serial_target = serial.Serial(self.device.port, self.device.baud_rate, timeout=1)
+            serial_target = SerialTransport(self.device.port, self.device.baud_rate)
+            serial_target.open()
             
-            time.sleep(2)  # Wait for Target to initialize
+            self.transport = serial_target
+            self.set_frame_mode("text")
+            self.dispatcher.reset()
             
-            pswd_err = PasswordException("Internal password check failed\nDevice is not a registered attendance device")
+            handshake = Handshake(self.device.pswd, self.device.allow_binary)
+            leftover = serial_target.handshake(handshake)
             
-            pswd_check_count = 0
-            while True:
-                serial_target.write((self.device.pswd + "\n").encode())
-                
-                if serial_target.in_waiting > 0:
-                    response = serial_target.readline().decode().strip()
-                    
-                    if self.device.pswd == response:
-                        self.connected = True
-                        break
-                    else:
-                        raise pswd_err
-                
-                pswd_check_count += 1
-                
-                if pswd_check_count >= 15:
-                    raise pswd_err
-                
-                time.sleep(1)
+            if handshake.state != "ready":
+                raise handshake.error()
             
-            self.device.connection_changed.emit(self.connected)
+            self.handshake_latency = handshake.latency
+            self.port_watcher.remember(self.device.port)
+            self.connection_message = f"Device answered in {handshake.latency * 1000:.0f} ms after {handshake.probes} probe(s)"
             
-            while self.connected:
-                if self.msg_buffer:
-                    serial_target.write((self.msg_buffer.pop(0) + "\n").encode())
-                
-                if serial_target.in_waiting > 0:
-                    bytetext = serial_target.readline()
-                    msg_recv = self._init_process_data(bytetext)
-                    
-                    if msg_recv:
-                        self._data_process(msg_recv)
+            if handshake.frame_mode == "binary":
+                # Binary capable firmware keeps talking text until it sees the acknowledgement
+                self.set_frame_mode("binary")
             
-            serial_target.close()
+            self._set_connected()
+            
+            writer = threading.Thread(target=self._write_loop, args=(serial_target,), daemon=True)
+            writer.start()
+            
+            if leftover:
+                self._on_data(leftover)
+            
+            # Blocks until the port closes, frames are dispatched from here as soon as their bytes arrive
+            serial_target.run(self._on_data)
         elif self.bluetooth_mode:
             assert self.device.addr is not None, "Invalid device"
             
-            # BLE override using bleak
-            async def run_ble():
-                async with BleakClient(self.device.addr) as client:
-                    # Automatically find first writable characteristic
-                    services = await client.services
-                    writable_char = None
-                    for service in services:
-                        for char in service.characteristics:
-                            if 'write' in char.properties or 'write-without-response' in char.properties:
-                                writable_char = char.uuid
-                                break
-                        if writable_char:
-                            break
-                    
-                    assert writable_char, "No writable characteristic found on device."
-                    
-                    while self.connected:
-                        if self.msg_buffer:
-                            msg = self.msg_buffer.pop(0)
-                            await client.write_gatt_char(writable_char, msg.encode())
-                        
-                        data = await client.read_gatt_char(writable_char)
-                        msg_recv = self._init_process_data(data)
-                        if msg_recv:
-                            self._data_process(msg_recv)
-
-            asyncio.run(run_ble())
+            ble_target = BLETransport(self.device.addr, self.io_loop)
+            
+            self.transport = ble_target
+            self.set_frame_mode("text")
+            self.dispatcher.reset()
+            
+            resumed = threading.Event()
+            
+            def resume_discovery():
+                if not resumed.is_set():
+                    resumed.set()
+                    self.ble_discovery.resume()
+            
+            def opened():
+                resume_discovery()
+                self._set_connected()
+                
+                writer = threading.Thread(target=self._write_loop, args=(ble_target,), daemon=True)
+                writer.start()
+            
+            ble_target.on_open = opened
+            
+            # Scanning while connecting makes most adapters drop the connection attempt, the scanner is shared
+            # by every gate and stays paused until each connect in progress has opened or failed
+            self.ble_discovery.pause().result()
+            
+            try:
+                # Frames arrive through GATT notifications and take the same path as serial bytes
+                ble_target.run(self._on_data)
+            finally:
+                resume_discovery()
     
     def _process_data(self, data: str):
-        processed_data = {}
-        for sub_data_string in data.split("|"):
-            name, data = sub_data_string.strip().split(":")
-            
-            processed_data[name] = self._process_sub_data(data)
-        
-        return processed_data
+        return self.parser.parse(data)
+
+
+class _SourceEmitter:
+    def __init__(self, hub: "ConnectionHub", source: str, signal: pyBoundSignal, with_source: bool):
+        self.hub = hub
+        self.source = source
+        self.signal = signal
+        self.with_source = with_source
     
-    def _process_sub_data(self, data: str, numbers: bool = False):
-        data = data.strip()
+    def emit(self, value):
+        self.hub._emit(self.source, self.signal, value, self.with_source)
+
+class ConnectionHub:
+    def __init__(self, connection_changed_signal: pyBoundSignal):
+        self.systems: dict[str, BaseCommSystem] = {}
+        self.connection_changed_signal = connection_changed_signal
         
-        if not numbers:
-            var_type = data[:data.find("(")]
+        self._subscriptions: list[tuple[str | list[str], pyBoundSignal, bool]] = []
+        self._lock = threading.Lock()
+        self._systems_lock = threading.Lock()
+    
+    @property
+    def connected(self):
+        return any(system.connected for system in self._gates())
+    
+    def link_states(self):
+        with self._systems_lock:
+            return {source: system.connected for source, system in self.systems.items()}
+    
+    def link_changed(self, _=None):
+        # A gate's link went up or down, receivers are told whether any gate is still connected
+        self.connection_changed_signal.emit(self.connected)
+    
+    def _gates(self):
+        # Network gates come and go from the IO loop thread while the GUI iterates
+        with self._systems_lock:
+            return list(self.systems.values())
+    
+    def add(self, source: str, system: BaseCommSystem):
+        with self._systems_lock:
+            if source in self.systems:
+                raise KeyError(f"Comm device {source} is already part of the hub")
             
-            data = data.removeprefix(var_type).strip().removeprefix(f"(").removesuffix(")")
+            for key, signal, with_source in self._subscriptions:
+                system.set_data_point(key, _SourceEmitter(self, source, signal, with_source))
             
-            if var_type == "l":
-                data = [self._process_sub_data(sub_data, True) for sub_data in data.split(",")]
-            elif var_type == "s":
-                data = data
-            elif var_type == "n":
-                data = float(data)
+            self.systems[source] = system
+    
+    def remove(self, source: str, system: BaseCommSystem | None = None):
+        with self._systems_lock:
+            # With a system given, only that one is removed, a newer one under the same source stays
+            if system is not None and self.systems.get(source) is not system:
+                return None
+            
+            system = self.systems.pop(source)
+        
+        if system.connected:
+            system.stop_connection()
+        
+        return system
+    
+    def set_data_point(self, key: str | list[str], signal: pyBoundSignal, with_source: bool = True):
+        with self._systems_lock:
+            self._subscriptions.append((key, signal, with_source))
+            
+            for source, system in self.systems.items():
+                system.set_data_point(key, _SourceEmitter(self, source, signal, with_source))
+    
+    def _emit(self, source: str, signal: pyBoundSignal, value, with_source: bool):
+        # Gates emit from their own threads, serializing here gives every receiver one global order
+        with self._lock:
+            if with_source:
+                signal.emit(value, source)
             else:
-                raise Exception(f"Type: ({var_type}) is not a valid type")
+                signal.emit(value)
+    
+    def send_message(self, msg: str, priority: int | None = None, delay: float = 0.0, source: str | None = None):
+        system = self.systems.get(source) if source is not None else None
+        
+        if system is not None:
+            system.send_message(msg, priority, delay)
         else:
-            data = float(data)
+            for system in self._gates():
+                system.send_message(msg, priority, delay)
+    
+    def start_all(self):
+        for system in self._gates():
+            if not system.connected and (system.serial_mode or system.bluetooth_mode or system.replay_path is not None):
+                system.start_connection()
+    
+    def stop_all(self):
+        for system in self._gates():
+            if system.connected:
+                system.stop_connection()
+    
+    def device_stats(self):
+        stats = {}
         
-        return data
-
-
+        with self._systems_lock:
+            systems = list(self.systems.items())
+        
+        for source, system in systems:
+            stats[source] = {
+                "connected": system.connected,
+                "frames": system.stats.lines_in.total if system.stats is not None else 0,
+                "frames_per_sec": system.stats.lines_in.rate() if system.stats is not None else 0.0,
+                "ingest_latency_ms": system.stats.ingest_latency.mean() * 1000 if system.stats is not None else 0.0,
+                "handshake_ms": system.handshake_latency * 1000,
+                "reconnecting": system.reconnecting,
+                "reconnects": system.reconnects,
+                "queue": system.msg_queue.metrics(),
+                "dedup": system.deduplicator.metrics()
+            }
+        
+        return stats
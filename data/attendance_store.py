@@ -0,0 +1,247 @@
+import numpy
+from typing import Iterable
+from itertools import groupby
+from operator import itemgetter
+
+from data.data_objects import AttendanceEntry, Staff
+from data.time_data_objects import DAYS_OF_THE_WEEK, Period
+
+_COLUMNS = {
+    "staff": numpy.int32,
+    "epoch": numpy.float64,
+    "day_seconds": numpy.float64,
+    "year_seconds": numpy.float64,
+    "weekday": numpy.int8,
+    "year": numpy.int32,
+    "check_in": numpy.bool_,
+    "device": numpy.int32,
+}
+
+def staff_key(staff: Staff):
+    # Teacher and prefect ids come from separate tables, so the type is part of the key
+    return type(staff).__name__, staff.id
+
+
+# Every attendance entry in scan order, plus one numpy column per field the charts and filters query.
+# Indexing, slicing, iteration and len behave like the plain list of entries it replaced
+class AttendanceStore:
+    def __init__(self, entries: Iterable[AttendanceEntry] = (), capacity: int = 1024):
+        self.entries: list[AttendanceEntry] = []
+        
+        self.staff_keys: list[tuple[str, str]] = []
+        self._staff_index: dict[tuple[str, str], int] = {}
+        
+        # Device 0 is "unknown", for entries logged by key presses or loaded from older files
+        self.device_names: list[str | None] = [None]
+        self._device_index: dict[str | None, int] = {None: 0}
+        
+        # (staff index, day number) to that day's entries in scan order
+        self._day_entries: dict[tuple[int, int], list[AttendanceEntry]] = {}
+        
+        self._size = 0
+        self._columns = {name: numpy.empty(capacity, dtype) for name, dtype in _COLUMNS.items()}
+        
+        self.extend(entries)
+    
+    def __getstate__(self):
+        # Columns are rebuilt from the entries on load, only the device ids are not part of an entry
+        return {"entries": self.entries, "device_names": self.device_names, "device": self.device.astype("<i4").tobytes()}
+    
+    def __setstate__(self, state: dict):
+        self.__init__(state["entries"])
+        
+        self.device_names = state["device_names"]
+        self._device_index = {name: i for i, name in enumerate(self.device_names)}
+        # Files from before the column was widened hold 16 bit ids
+        self.device[:] = numpy.frombuffer(state["device"], "<i2" if len(state["device"]) == 2 * len(self) else "<i4")
+    
+    def __len__(self):
+        return self._size
+    
+    def __iter__(self):
+        return iter(self.entries)
+    
+    def __getitem__(self, index: int | slice):
+        return self.entries[index]
+    
+    def __repr__(self):
+        return f"AttendanceStore({self._size} entries, {len(self.staff_keys)} staff)"
+    
+    def _grow(self, needed: int):
+        capacity = len(self._columns["epoch"])
+        
+        if needed <= capacity:
+            return
+        
+        while capacity < needed:
+            capacity *= 2
+        
+        for name, column in self._columns.items():
+            grown = numpy.empty(capacity, column.dtype)
+            grown[:self._size] = column[:self._size]
+            
+            self._columns[name] = grown
+    
+    def _staff_id(self, staff: Staff):
+        key = staff_key(staff)
+        
+        if key not in self._staff_index:
+            self._staff_index[key] = len(self.staff_keys)
+            self.staff_keys.append(key)
+        
+        return self._staff_index[key]
+    
+    def _device_id(self, device: str | None):
+        if device not in self._device_index:
+            self._device_index[device] = len(self.device_names)
+            self.device_names.append(device)
+        
+        return self._device_index[device]
+    
+    def append(self, entry: AttendanceEntry, device: str | None = None):
+        self._grow(self._size + 1)
+        
+        i = self._size
+        period = entry.period
+        staff_id = self._staff_id(entry.staff)
+        
+        self._columns["staff"][i] = staff_id
+        self._columns["epoch"][i] = period.epoch
+        self._columns["day_seconds"][i] = period.time.in_seconds()
+        self._columns["year_seconds"][i] = period.in_year_seconds()
+        self._columns["weekday"][i] = period.day_index
+        self._columns["year"][i] = period.year
+        self._columns["check_in"][i] = entry.is_check_in
+        self._columns["device"][i] = self._device_id(device)
+        
+        self.entries.append(entry)
+        self._day_entries.setdefault((staff_id, period.days), []).append(entry)
+        self._size += 1
+    
+    def extend(self, entries: Iterable[AttendanceEntry], device: str | None = None):
+        entries = list(entries)
+        
+        if not entries:
+            return
+        
+        start, end = self._size, self._size + len(entries)
+        self._grow(end)
+        
+        periods = [entry.period for entry in entries]
+        staff_ids = [self._staff_id(entry.staff) for entry in entries]
+        
+        self._columns["staff"][start:end] = staff_ids
+        self._columns["epoch"][start:end] = [period.epoch for period in periods]
+        self._columns["day_seconds"][start:end] = [period.time.in_seconds() for period in periods]
+        self._columns["year_seconds"][start:end] = [period.in_year_seconds() for period in periods]
+        self._columns["weekday"][start:end] = [period.day_index for period in periods]
+        self._columns["year"][start:end] = [period.year for period in periods]
+        self._columns["check_in"][start:end] = [entry.is_check_in for entry in entries]
+        self._columns["device"][start:end] = self._device_id(device)
+        
+        for entry, staff_id, period in zip(entries, staff_ids, periods):
+            self._day_entries.setdefault((staff_id, period.days), []).append(entry)
+        
+        self.entries.extend(entries)
+        self._size = end
+    
+    def prepend(self, older: list[tuple[AttendanceEntry, str | None]]):
+        # History read in after the recent scans goes in front of them, the columns are rebuilt in the new order
+        recent = list(zip(self.entries, [self.device_names[device] for device in self.device.tolist()]))
+        
+        self.__init__(capacity=max(1024, len(older) + len(recent)))
+        
+        for device, group in groupby(older + recent, key=itemgetter(1)):
+            self.extend([entry for entry, _ in group], device)
+    
+    def first_since(self, epoch: float):
+        # Index of the first entry scanned on or after epoch, len(self) if there is none
+        later = numpy.flatnonzero(self.epoch >= epoch)
+        
+        return int(later[0]) if len(later) else self._size
+    
+    def years(self) -> list[int]:
+        return numpy.unique(self.year).tolist()
+    
+    def day_entries(self, staff: Staff, period: Period) -> list[AttendanceEntry]:
+        index = self._staff_index.get(staff_key(staff))
+        
+        if index is None:
+            return []
+        
+        return self._day_entries.get((index, period.days), [])
+    
+    def latest_of_day(self, staff: Staff, period: Period):
+        entries = self.day_entries(staff, period)
+        
+        return entries[-1] if entries else None
+    
+    def column(self, name: str):
+        return self._columns[name][:self._size]
+    
+    @property
+    def staff(self):
+        return self.column("staff")
+    
+    @property
+    def epoch(self):
+        return self.column("epoch")
+    
+    @property
+    def day_seconds(self):
+        return self.column("day_seconds")
+    
+    @property
+    def weekday(self):
+        return self.column("weekday")
+    
+    @property
+    def year(self):
+        return self.column("year")
+    
+    @property
+    def check_in(self):
+        return self.column("check_in")
+    
+    @property
+    def device(self):
+        return self.column("device")
+    
+    def staff_mask(self, staff: Staff):
+        index = self._staff_index.get(staff_key(staff))
+        
+        if index is None:
+            return numpy.zeros(self._size, numpy.bool_)
+        
+        return self.staff == index
+    
+    def range_mask(self, start: Period, end: Period):
+        # Same rule as Period.within, year 0 ranges repeat every year
+        if start.year == 0 and end.year == 0:
+            column = self.column("year_seconds")
+            
+            return (column >= start.in_year_seconds()) & (column <= end.in_year_seconds())
+        
+        return (self.epoch >= start.epoch) & (self.epoch <= end.epoch)
+    
+    def weekday_mask(self, days: Iterable[str]):
+        return numpy.isin(self.weekday, [DAYS_OF_THE_WEEK.index(day) for day in days])
+    
+    def countable_mask(self, valid_days: Iterable[str], timeline_dates: list[tuple[Period, Period]], staff: Staff | None = None):
+        # Whole column version of BaseDataDisplayWidget.is_entry_countable
+        in_timeline = numpy.zeros(self._size, numpy.bool_)
+        
+        for start, end in timeline_dates:
+            in_timeline |= self.range_mask(start, end)
+        
+        mask = in_timeline & self.check_in & self.weekday_mask(valid_days)
+        
+        if staff is not None:
+            mask &= self.staff_mask(staff)
+        
+        return mask
+    
+    def select(self, mask: numpy.ndarray):
+        entries = self.entries
+        
+        return [entries[i] for i in numpy.flatnonzero(mask)]
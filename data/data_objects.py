@@ -40,10 +40,21 @@ class Prefect(Staff):
     duties: dict[str, list[str]]
 
 
-@dataclass
+_ENTRY_FIELDS = ("period", "staff", "is_check_in")
+
+# Entries are never edited once logged, so they are frozen as well as slotted
+@dataclass(slots=True, frozen=True)
 class AttendanceEntry:
     period: Period
     
     staff: Staff
     
     is_check_in: bool = True
+    
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in _ENTRY_FIELDS}
+    
+    def __setstate__(self, state: dict):
+        # Same shape as the __dict__ pickled into .cdat files from before slots
+        for name in _ENTRY_FIELDS:
+            object.__setattr__(self, name, state[name])
@@ -0,0 +1,356 @@
+import os
+import json
+import pickle
+import sqlite3
+import threading
+from typing import Callable, Iterator
+
+from data.attendance_store import staff_key
+from data.data_objects import AttendanceEntry, Class, Staff, Subject, Teacher, Prefect
+from data.journal import Journal, load_journaled
+from data.main_data_objects import AppData
+from data.metadata_objects import CharacterName, Department
+from data.time_data_objects import Period, Time
+
+# A .cdb file is a SQLite database holding the same AppData as a .cdat file, one row per staff member, subject,
+# timeline and scan. Scans are inserted as they happen and reports query ranges without loading the whole history
+DATABASE_SUFFIX = ".cdb"
+_SQLITE_HEADER = b"SQLite format 3\x00"
+
+_PERIOD_COLUMNS = ("day", "date", "month", "year", "hour", "min", "sec")
+
+# AppData fields kept in their own tables, the rest are pickled into settings
+_TABLED_FIELDS = {"teachers", "prefects", "teacher_timeline_dates", "prefect_timeline_dates", "attendance_data"}
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value BLOB NOT NULL);
+
+CREATE TABLE IF NOT EXISTS departments (id TEXT PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS classes (id TEXT PRIMARY KEY, name TEXT NOT NULL);
+
+CREATE TABLE IF NOT EXISTS staff (
+    kind TEXT NOT NULL, id TEXT NOT NULL, position INTEGER NOT NULL, iud TEXT,
+    sur TEXT, first TEXT, middle TEXT, abrev TEXT, other TEXT, img_path TEXT,
+    department_id TEXT, post_name TEXT, class_id TEXT, duties TEXT,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS staff_iud ON staff (iud);
+
+CREATE TABLE IF NOT EXISTS subjects (
+    staff_kind TEXT NOT NULL, staff_id TEXT NOT NULL, position INTEGER NOT NULL,
+    id TEXT, name TEXT, class_id TEXT, periods TEXT,
+    PRIMARY KEY (staff_kind, staff_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS timelines (
+    kind TEXT NOT NULL, position INTEGER NOT NULL,
+    {", ".join(f"start_{column}" for column in _PERIOD_COLUMNS)},
+    {", ".join(f"end_{column}" for column in _PERIOD_COLUMNS)},
+    PRIMARY KEY (kind, position)
+);
+
+CREATE TABLE IF NOT EXISTS attendance (
+    id INTEGER PRIMARY KEY,
+    staff_kind TEXT NOT NULL, staff_id TEXT NOT NULL,
+    epoch REAL NOT NULL, {", ".join(_PERIOD_COLUMNS)},
+    check_in INTEGER NOT NULL, device TEXT
+);
+CREATE INDEX IF NOT EXISTS attendance_staff ON attendance (staff_kind, staff_id, epoch);
+CREATE INDEX IF NOT EXISTS attendance_epoch ON attendance (epoch);
+CREATE INDEX IF NOT EXISTS attendance_year ON attendance (year);
+"""
+
+_ATTENDANCE_INSERT = f"INSERT INTO attendance (staff_kind, staff_id, epoch, {", ".join(_PERIOD_COLUMNS)}, check_in, device) VALUES ({", ".join("?" * (len(_PERIOD_COLUMNS) + 5))})"
+_ATTENDANCE_SELECT = f"SELECT staff_kind, staff_id, {", ".join(_PERIOD_COLUMNS)}, check_in, device FROM attendance"
+
+
+def is_database(path: str):
+    with open(path, "rb") as file:
+        return file.read(len(_SQLITE_HEADER)) == _SQLITE_HEADER
+
+
+def _period_row(period: Period):
+    return period.day, period.date, period.month, period.year, period.time.hour, period.time.min, period.time.sec
+
+def _row_period(row: tuple):
+    day, date, month, year, hour, min, sec = row
+    
+    return Period(Time(hour, min, sec), day, date, month, year)
+
+
+class AttendanceDatabase:
+    def __init__(self, path: str, new: bool = False):
+        self.path = path
+        self.error: Exception | None = None
+        
+        # Opened on the file the data was loaded from, every entry in the store is already a row. A new file has none
+        # until the first checkpoint, after that only the scans whose insert failed are missing
+        self._synced = not new
+        self._failed_rows: list[tuple] = []
+        
+        if new:
+            for stale in (path, path + "-wal", path + "-shm"):
+                if os.path.exists(stale):
+                    os.remove(stale)
+        
+        self._connection = sqlite3.connect(path)
+        
+        # A commit only waits for the write ahead log, readers never block the scan inserts
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+    
+    def settings(self):
+        return {key: pickle.loads(value) for key, value in self._connection.execute("SELECT key, value FROM settings")}
+    
+    def roster(self) -> tuple[dict[str, Teacher], dict[str, Prefect]]:
+        departments = {id: Department(id, name) for id, name in self._connection.execute("SELECT id, name FROM departments")}
+        classes = {id: Class(id, name) for id, name in self._connection.execute("SELECT id, name FROM classes")}
+        
+        subjects: dict[tuple[str, str], list[Subject]] = {}
+        
+        for staff_kind, staff_id, id, name, class_id, periods in self._connection.execute("SELECT staff_kind, staff_id, id, name, class_id, periods FROM subjects ORDER BY staff_kind, staff_id, position"):
+            subjects.setdefault((staff_kind, staff_id), []).append(Subject(id, name, classes.get(class_id), [tuple(period) for period in json.loads(periods)]))
+        
+        teachers: dict[str, Teacher] = {}
+        prefects: dict[str, Prefect] = {}
+        
+        for kind, id, IUD, sur, first, middle, abrev, other, img_path, department_id, post_name, class_id, duties in self._connection.execute(
+            "SELECT kind, id, iud, sur, first, middle, abrev, other, img_path, department_id, post_name, class_id, duties FROM staff ORDER BY position"
+        ):
+            name = CharacterName(sur, first, middle, abrev, other)
+            
+            if kind == Prefect.__name__:
+                prefects[id] = Prefect(id, IUD, name, img_path, [], post_name, classes.get(class_id), json.loads(duties))
+            else:
+                teachers[id] = Teacher(id, IUD, name, img_path, [], departments.get(department_id), subjects.get((kind, id), []))
+        
+        return teachers, prefects
+    
+    def timelines(self, kind: str) -> list[tuple[Period, Period]]:
+        size = len(_PERIOD_COLUMNS)
+        rows = self._connection.execute(f"SELECT {", ".join(f"start_{column}" for column in _PERIOD_COLUMNS)}, {", ".join(f"end_{column}" for column in _PERIOD_COLUMNS)} FROM timelines WHERE kind = ? ORDER BY position", (kind,))
+        
+        return [(_row_period(row[:size]), _row_period(row[size:])) for row in rows]
+    
+    def _attendance_rows(self, start: Period | None = None, end: Period | None = None, staff: Staff | None = None, first_id: int | None = None, stop_id: int | None = None, columns: str = _ATTENDANCE_SELECT):
+        # start and end are real dates, year 0 timeline ranges repeat every year and have no single epoch
+        conditions, parameters = [], []
+        
+        if staff is not None:
+            conditions.append("staff_kind = ? AND staff_id = ?")
+            parameters.extend(staff_key(staff))
+        if start is not None:
+            conditions.append("epoch >= ?")
+            parameters.append(start.epoch)
+        if end is not None:
+            conditions.append("epoch <= ?")
+            parameters.append(end.epoch)
+        if first_id is not None:
+            conditions.append("id >= ?")
+            parameters.append(first_id)
+        if stop_id is not None:
+            conditions.append("id < ?")
+            parameters.append(stop_id)
+        
+        query = columns + (f" WHERE {" AND ".join(conditions)}" if conditions else "")
+        
+        return self._connection.execute(query + (" ORDER BY id" if columns == _ATTENDANCE_SELECT else ""), parameters)
+    
+    def entries(self, staff_by_key: Callable[[tuple[str, str]], Staff | None], start: Period | None = None, end: Period | None = None, staff: Staff | None = None, first_id: int | None = None, stop_id: int | None = None) -> Iterator[tuple[AttendanceEntry, str | None]]:
+        # Rows are turned into entries as they are read, staff_by_key is usually AppData.staff_by_key
+        size = len(_PERIOD_COLUMNS)
+        
+        for row in self._attendance_rows(start, end, staff, first_id, stop_id):
+            member = staff_by_key(row[:2])
+            
+            if member is not None:
+                yield AttendanceEntry(_row_period(row[2:2 + size]), member, bool(row[2 + size])), row[3 + size]
+    
+    def count(self, start: Period | None = None, end: Period | None = None, staff: Staff | None = None) -> int:
+        return self._attendance_rows(start, end, staff, columns="SELECT count(*) FROM attendance").fetchone()[0]
+    
+    def years(self) -> list[int]:
+        # One index lookup per year instead of a scan of the whole table
+        years = []
+        year = self._connection.execute("SELECT min(year) FROM attendance").fetchone()[0]
+        
+        while year is not None:
+            years.append(year)
+            year = self._connection.execute("SELECT min(year) FROM attendance WHERE year > ?", (year,)).fetchone()[0]
+        
+        return years
+    
+    def staff_key_by_iud(self, IUD: str) -> tuple[str, str] | None:
+        # Prefects first, like AppData's own IUD index
+        row = self._connection.execute("SELECT kind, id FROM staff WHERE iud = ? ORDER BY kind != ?, position LIMIT 1", (IUD, Prefect.__name__)).fetchone()
+        
+        return tuple(row) if row is not None else None
+    
+    def load(self, since: float | None = None) -> AppData:
+        teachers, prefects = self.roster()
+        
+        data = AppData(
+            **self.settings(),
+            teacher_timeline_dates=self.timelines("teacher"),
+            prefect_timeline_dates=self.timelines("prefect"),
+            teachers=teachers,
+            prefects=prefects,
+            attendance_data=[]
+        )
+        
+        # With since, an epoch, only the scans from the first one on or after it are loaded, the older ones are read in the background
+        first_id = None
+        
+        if since is not None:
+            first_id, stop_id = self._connection.execute("SELECT (SELECT min(id) FROM attendance WHERE epoch >= ?), (SELECT max(id) + 1 FROM attendance)", (since,)).fetchone()
+            first_id = first_id if first_id is not None else stop_id
+        
+        for entry, device in self.entries(data.staff_by_key, first_id=first_id):
+            data.attendance_data.append(entry, device)
+            entry.staff.attendance.append(entry)
+        
+        if first_id is not None and self._connection.execute("SELECT 1 FROM attendance WHERE id < ? LIMIT 1", (first_id,)).fetchone():
+            data.defer_history(HistoryReader(self.path, first_id, data.staff_by_key, self.years()))
+        
+        return data
+    
+    # The rest is the journal interface AppData writes its changes through, see data/journal.py
+    def append(self, kind: str, *payload):
+        try:
+            with self._connection:
+                if kind == "entry":
+                    key, period, is_check_in, device = payload
+                    row = (*key, period.epoch, *_period_row(period), is_check_in, device)
+                    
+                    try:
+                        self._connection.execute(_ATTENDANCE_INSERT, row)
+                    except sqlite3.Error:
+                        self._failed_rows.append(row)
+                        raise
+                elif kind == "iud":
+                    key, IUD = payload
+                    self._connection.execute("UPDATE staff SET iud = ? WHERE kind = ? AND id = ?", (IUD, *key))
+                else:
+                    raise ValueError(f"Journal record type: ({kind}) is not supported")
+        except sqlite3.Error as e:
+            self.error = e
+    
+    def flush(self):
+        pass
+    
+    def checkpoint(self, data: AppData):
+        # Everything but the attendance is small and rewritten, scans already inserted one by one are kept and only the
+        # ones whose insert failed are retried
+        staff: list[Staff] = list(data.teachers.values()) + list(data.prefects.values())
+        
+        departments = {member.department.id: member.department for member in staff if isinstance(member, Teacher) and member.department is not None}
+        classes = {member.cls.id: member.cls for member in staff if isinstance(member, Prefect) and member.cls is not None}
+        classes.update({subject.cls.id: subject.cls for member in staff if isinstance(member, Teacher) for subject in member.subjects if subject.cls is not None})
+        
+        with self._connection:
+            for table in ("settings", "departments", "classes", "staff", "subjects", "timelines"):
+                self._connection.execute(f"DELETE FROM {table}")
+            
+            self._connection.executemany("INSERT INTO settings VALUES (?, ?)", [(key, pickle.dumps(value)) for key, value in data.__getstate__().items() if key not in _TABLED_FIELDS])
+            self._connection.executemany("INSERT INTO departments VALUES (?, ?)", [(department.id, department.name) for department in departments.values()])
+            self._connection.executemany("INSERT INTO classes VALUES (?, ?)", [(cls.id, cls.name) for cls in classes.values()])
+            
+            self._connection.executemany("INSERT INTO staff VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+                (
+                    *staff_key(member), position, member.IUD,
+                    member.name.sur, member.name.first, member.name.middle, member.name.abrev, member.name.other, member.img_path,
+                    member.department.id if isinstance(member, Teacher) and member.department is not None else None,
+                    member.post_name if isinstance(member, Prefect) else None,
+                    member.cls.id if isinstance(member, Prefect) and member.cls is not None else None,
+                    json.dumps(member.duties) if isinstance(member, Prefect) else None
+                )
+                for position, member in enumerate(staff)
+            ])
+            
+            self._connection.executemany("INSERT INTO subjects VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                (*staff_key(member), position, subject.id, subject.name, subject.cls.id if subject.cls is not None else None, json.dumps(subject.periods))
+                for member in staff if isinstance(member, Teacher)
+                for position, subject in enumerate(member.subjects)
+            ])
+            
+            self._connection.executemany(f"INSERT INTO timelines VALUES ({", ".join("?" * (2 + 2 * len(_PERIOD_COLUMNS)))})", [
+                (kind, position, *_period_row(start), *_period_row(end))
+                for kind, timeline_dates in (("teacher", data.teacher_timeline_dates), ("prefect", data.prefect_timeline_dates))
+                for position, (start, end) in enumerate(timeline_dates)
+            ])
+            
+            if self._synced:
+                self._connection.executemany(_ATTENDANCE_INSERT, self._failed_rows)
+            else:
+                store = data.attendance_data
+                
+                self._connection.executemany(_ATTENDANCE_INSERT, (
+                    (*staff_key(entry.staff), entry.period.epoch, *_period_row(entry.period), entry.is_check_in, store.device_names[device])
+                    for entry, device in zip(store.entries, store.device.tolist())
+                ))
+        
+        self._synced = True
+        self._failed_rows.clear()
+        self.error = None
+    
+    def close(self):
+        self._connection.close()
+
+
+class HistoryReader:
+    # Reads the scans before stop_id on a connection of its own in a background thread, for AppData.defer_history
+    def __init__(self, path: str, stop_id: int, staff_by_key: Callable[[tuple[str, str]], Staff | None], years: list[int]):
+        self.years = years
+        
+        self._entries: list[tuple[AttendanceEntry, str | None]] = []
+        self._error: Exception | None = None
+        
+        self._thread = threading.Thread(target=self._read, args=(path, stop_id, staff_by_key), daemon=True)
+        self._thread.start()
+    
+    def _read(self, path: str, stop_id: int, staff_by_key: Callable[[tuple[str, str]], Staff | None]):
+        try:
+            database = AttendanceDatabase(path)
+            
+            try:
+                self._entries = list(database.entries(staff_by_key, stop_id=stop_id))
+            finally:
+                database.close()
+        except Exception as e:
+            self._error = e
+    
+    def done(self):
+        return not self._thread.is_alive()
+    
+    def wait(self):
+        self._thread.join()
+        
+        if self._error is not None:
+            raise self._error
+        
+        return self._entries
+
+
+def import_cdat(cdat_path: str, path: str):
+    database = AttendanceDatabase(path, new=True)
+    
+    try:
+        database.checkpoint(load_journaled(cdat_path))
+    finally:
+        database.close()
+
+def export_cdat(path: str, cdat_path: str):
+    database = AttendanceDatabase(path)
+    
+    try:
+        data = database.load()
+    finally:
+        database.close()
+    
+    journal = Journal(cdat_path, data.journal_seq)
+    
+    try:
+        journal.checkpoint(data)
+    finally:
+        journal.close()
@@ -0,0 +1,283 @@
+import os
+import zlib
+import pickle
+import time
+import struct
+import threading
+
+from data.attendance_store import staff_key
+from data.data_objects import AttendanceEntry
+from data.main_data_objects import AppData
+
+# A .cdat file is a pickled AppData snapshot. Changes made since it was written are appended to
+# "<file>.journal" as (seq, length, crc32) headed records, so a scan costs one small write instead of a full save
+JOURNAL_MAGIC = b"CDJRNL\x01"
+_RECORD = struct.Struct("<QII")
+
+def journal_path(path: str):
+    return path + ".journal"
+
+def folding_path(path: str):
+    # A journal segment being folded into a new snapshot, left behind if compaction was cut short
+    return path + ".journal.folding"
+
+
+def read_journal(path: str):
+    # Returns the intact records and where they end, a torn or corrupt tail from a crash is left out
+    with open(path, "rb") as file:
+        data = file.read()
+    
+    if not data.startswith(JOURNAL_MAGIC):
+        return [], 0
+    
+    records = []
+    offset = len(JOURNAL_MAGIC)
+    
+    while offset + _RECORD.size <= len(data):
+        seq, length, crc = _RECORD.unpack_from(data, offset)
+        body = data[offset + _RECORD.size:offset + _RECORD.size + length]
+        
+        if len(body) < length or zlib.crc32(body) != crc:
+            break
+        
+        kind, payload = pickle.loads(body)
+        records.append((seq, kind, payload))
+        
+        offset += _RECORD.size + length
+    
+    return records, offset
+
+
+def apply_record(data: AppData, kind: str, payload: tuple):
+    if kind == "entry":
+        key, period, is_check_in, device = payload
+        staff = data.staff_by_key(key)
+        
+        if staff is not None:
+            data.add_attendance(AttendanceEntry(period, staff, is_check_in), device)
+    elif kind == "iud":
+        key, IUD = payload
+        staff = data.staff_by_key(key)
+        
+        if staff is not None:
+            data.set_iud(staff, IUD)
+    else:
+        raise ValueError(f"Journal record type: ({kind}) is not supported")
+
+
+def load_journaled(path: str, segments: tuple[str, ...] | None = None) -> AppData:
+    with open(path, "rb") as file:
+        data: AppData = pickle.load(file)
+    
+    for segment in (folding_path(path), journal_path(path)) if segments is None else segments:
+        if not os.path.exists(segment):
+            continue
+        
+        for seq, kind, payload in read_journal(segment)[0]:
+            # Records already in the snapshot are skipped, so replaying a segment twice is harmless
+            if seq > data.journal_seq:
+                apply_record(data, kind, payload)
+                data.journal_seq = seq
+    
+    return data
+
+
+def _sync_dir(path: str):
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+def write_snapshot(path: str, data: AppData):
+    # Written beside the file and swapped in, a crash leaves either the old snapshot or the new one
+    tmp_path = path + ".tmp"
+    
+    with open(tmp_path, "wb") as file:
+        pickle.dump(data, file)
+        file.flush()
+        os.fsync(file.fileno())
+    
+    os.replace(tmp_path, path)
+    _sync_dir(path)
+
+
+class Journal:
+    def __init__(self, path: str, seq: int = 0, flush_interval: float = 0.05, compact_records: int = 5000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.compact_records = compact_records
+        
+        self.error: Exception | None = None
+        
+        records, end = read_journal(journal_path(path)) if os.path.exists(journal_path(path)) else ([], 0)
+        
+        self.seq = max([seq] + [record_seq for record_seq, _, _ in records])
+        self.records = len(records)
+        
+        self._pending: list[bytes] = []
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._closed = False
+        
+        self._file = self._open_segment(end)
+        self._compactor: threading.Thread | None = None
+        
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+        
+        if self.records >= self.compact_records or os.path.exists(folding_path(path)):
+            self.compact()
+    
+    def _open_segment(self, end: int = 0):
+        if end:
+            file = open(journal_path(self.path), "r+b")
+            
+            # Drop whatever a crash left half written after the last intact record
+            file.truncate(end)
+            file.seek(end)
+        else:
+            file = open(journal_path(self.path), "wb")
+            file.write(JOURNAL_MAGIC)
+        
+        file.flush()
+        os.fsync(file.fileno())
+        
+        return file
+    
+    def append(self, kind: str, *payload):
+        body = pickle.dumps((kind, payload), pickle.HIGHEST_PROTOCOL)
+        
+        with self._cond:
+            self.seq += 1
+            self.records += 1
+            
+            self._pending.append(_RECORD.pack(self.seq, len(body), zlib.crc32(body)) + body)
+            self._cond.notify()
+        
+        if self.records >= self.compact_records:
+            self.compact()
+    
+    def _take(self):
+        # Called holding _cond, the io lock is taken before _cond is let go so batches reach the file in order
+        batch = b"".join(self._pending)
+        self._pending.clear()
+        
+        self._io_lock.acquire()
+        
+        return batch
+    
+    def _write(self, batch: bytes):
+        # Called holding the io lock
+        if not batch:
+            return
+        
+        try:
+            self._file.write(batch)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            self.error = e
+    
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                
+                if self._closed:
+                    return
+            
+            # Scans arriving in a burst share one fsync
+            time.sleep(self.flush_interval)
+            
+            with self._cond:
+                batch = self._take()
+            
+            try:
+                self._write(batch)
+            finally:
+                self._io_lock.release()
+    
+    def flush(self):
+        with self._cond:
+            batch = self._take()
+        
+        try:
+            self._write(batch)
+        finally:
+            self._io_lock.release()
+    
+    def compact(self):
+        if self._compactor is not None and self._compactor.is_alive() or not os.path.exists(self.path):
+            return
+        
+        with self._cond:
+            batch = self._take()
+        
+        try:
+            self._write(batch)
+            
+            # A segment left from an unfinished compaction is folded first, the live one waits for the next round
+            if not os.path.exists(folding_path(self.path)):
+                self._file.close()
+                os.replace(journal_path(self.path), folding_path(self.path))
+                
+                self._file = self._open_segment()
+                self.records = 0
+        finally:
+            self._io_lock.release()
+        
+        self._compactor = threading.Thread(target=self._fold, daemon=True)
+        self._compactor.start()
+    
+    def _fold(self):
+        # Works on its own copy loaded from disk, the live AppData is never touched off the GUI thread
+        try:
+            data = load_journaled(self.path, (folding_path(self.path),))
+            write_snapshot(self.path, data)
+            
+            os.remove(folding_path(self.path))
+        except Exception as e:
+            self.error = e
+    
+    def wait_compaction(self):
+        if self._compactor is not None:
+            self._compactor.join()
+    
+    def checkpoint(self, data: AppData):
+        # A full save, everything journaled so far is in the snapshot so the journal starts over
+        self.wait_compaction()
+        
+        with self._cond:
+            batch = self._take()
+        
+        try:
+            self._write(batch)
+            
+            data.journal_seq = self.seq
+            write_snapshot(self.path, data)
+            
+            self._file.close()
+            self._file = self._open_segment()
+            self.records = 0
+            
+            if os.path.exists(folding_path(self.path)):
+                os.remove(folding_path(self.path))
+            
+            self.error = None
+        finally:
+            self._io_lock.release()
+    
+    def close(self):
+        self.flush()
+        self.wait_compaction()
+        
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        
+        self._writer.join()
+        self._file.close()
@@ -1,8 +1,9 @@
 
 from typing import Any
 from dataclasses import dataclass
-from data.data_objects import Teacher, Prefect, AttendanceEntry
+from data.data_objects import Staff, Teacher, Prefect, AttendanceEntry
 from data.time_data_objects import Time, Period
+from data.attendance_store import AttendanceStore, staff_key
 
 @dataclass
 class AppData:
@@ -26,10 +27,14 @@ class AppData:
     
     variables: dict[str, Any]
     
-    attendance_data: list[AttendanceEntry]
+    attendance_data: AttendanceStore
+    
+    # Last journal record folded into this snapshot, see data/journal.py
+    journal_seq: int
     
     def __init__(self, /, **kwds):
         self.__dict__ = kwds
+        self._prepare()
         
         assert \
             self.prefect_cit.in_minutes() + self.prefect_cin_border_interval_minutes < self.prefect_cot.in_minutes() - self.prefect_cout_border_interval_minutes,\
@@ -38,7 +43,146 @@ class AppData:
         assert \
             self.teacher_cit.in_minutes() + self.teacher_cin_border_interval_minutes < self.teacher_cot.in_minutes() - self.teacher_cout_border_interval_minutes,\
             f"\nTeacher Check-In and Check-Out times overlap:\n\nCheck-In upper border: {self.teacher_cit.in_minutes() + self.teacher_cin_border_interval_minutes}\nCheck-Out lower border: {self.teacher_cot.in_minutes() - self.teacher_cout_border_interval_minutes}"
-
-
-
-
+    
+    def __getstate__(self):
+        assert self._history is None, "Older attendance history is still deferred, load_history() has to run before saving"
+        
+        # Underscored attributes are indexes rebuilt on load
+        return {key: value for key, value in self.__dict__.items() if not key.startswith("_")}
+    
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._prepare()
+    
+    def _prepare(self):
+        self.__dict__.setdefault("journal_seq", 0)
+        self._journal = None
+        self._history = None
+        
+        # Set by a change the journal never got, only a full save (checkpoint) clears it
+        self._unjournaled = False
+        
+        self._load_attendance()
+        self._index_iuds()
+    
+    def _load_attendance(self):
+        # Json data and .cdat files from before the columnar store hold a plain list of entries
+        if not isinstance(self.attendance_data, AttendanceStore):
+            self.attendance_data = AttendanceStore(self.attendance_data)
+    
+    def _index_iuds(self):
+        self._iud_index: dict[str, Staff] = {}
+        self._duplicate_iuds: dict[str, list[Staff]] = {}
+        
+        # Prefects first, a duplicated card keeps resolving to whoever the old linear lookups found
+        for staff in list(self.prefects.values()) + list(self.teachers.values()):
+            if not staff.IUD:
+                continue
+            
+            holder = self._iud_index.setdefault(staff.IUD, staff)
+            
+            if holder is not staff:
+                self._duplicate_iuds.setdefault(staff.IUD, [holder]).append(staff)
+    
+    @property
+    def duplicate_iuds(self):
+        return self._duplicate_iuds
+    
+    def staff_by_iud(self, IUD: str) -> Staff | None:
+        return self._iud_index.get(IUD)
+    
+    def set_iud(self, staff: Staff, IUD: str | None):
+        if staff.IUD in self._duplicate_iuds:
+            # The card falls back to whoever else still holds it
+            holders = [holder for holder in self._duplicate_iuds[staff.IUD] if holder is not staff]
+            self._iud_index[staff.IUD] = holders[0]
+            
+            if len(holders) > 1:
+                self._duplicate_iuds[staff.IUD] = holders
+            else:
+                del self._duplicate_iuds[staff.IUD]
+        elif staff.IUD and self._iud_index.get(staff.IUD) is staff:
+            del self._iud_index[staff.IUD]
+        
+        staff.IUD = IUD
+        
+        if IUD:
+            self._iud_index[IUD] = staff
+        
+        self._log("iud", staff_key(staff), IUD)
+    
+    def staff_by_key(self, key: tuple[str, str]) -> Staff | None:
+        kind, id = key
+        
+        return (self.prefects if kind == Prefect.__name__ else self.teachers).get(id)
+    
+    def add_attendance(self, entry: AttendanceEntry, device: str | None = None):
+        self.attendance_data.append(entry, device)
+        entry.staff.attendance.append(entry)
+        
+        self._log("entry", staff_key(entry.staff), entry.period, entry.is_check_in, device)
+    
+    def _log(self, kind: str, *payload):
+        # Without a journal (a new file, or a file being loaded and replayed) journaled() is False anyway
+        if self._journal is None:
+            return
+        
+        self._journal.append(kind, *payload)
+        
+        if self._journal.error is not None:
+            self._unjournaled = True
+    
+    def defer_history(self, history):
+        # Scans older than the loaded ones, still being read in the background, see data/database.py HistoryReader
+        self._history = history
+    
+    def history_pending(self):
+        return self._history is not None
+    
+    def history_ready(self):
+        return self._history is None or self._history.done()
+    
+    def load_history(self):
+        # Waits for the deferred scans if they are still being read, returns how many were put in front of the loaded ones
+        if self._history is None:
+            return 0
+        
+        older: list[tuple[AttendanceEntry, str | None]] = self._history.wait()
+        self._history = None
+        
+        self.attendance_data.prepend(older)
+        
+        # Staff compare by value, so they are told apart by identity
+        staff_older: dict[int, tuple[Staff, list[AttendanceEntry]]] = {}
+        
+        for entry, _ in older:
+            staff_older.setdefault(id(entry.staff), (entry.staff, []))[1].append(entry)
+        
+        for staff, entries in staff_older.values():
+            staff.attendance[:0] = entries
+        
+        return len(older)
+    
+    def years(self) -> list[int]:
+        return sorted(set(self.attendance_data.years()) | (set(self._history.years) if self._history is not None else set()))
+    
+    @property
+    def journal(self):
+        return self._journal
+    
+    def attach_journal(self, journal):
+        self._journal = journal
+    
+    def mark_unjournaled(self):
+        # For edits made outside the journal, they stay unsaved until the next full save
+        self._unjournaled = True
+    
+    def checkpoint(self):
+        # A full save writes every change, including the ones the journal never got
+        self._journal.checkpoint(self)
+        self._unjournaled = False
+    
+    def journaled(self):
+        # Whether every change so far has reached the journal, a failed write or a change made without one leaves the
+        # data unsaved
+        return self._journal is not None and self._journal.error is None and not self._unjournaled
@@ -17,6 +17,32 @@ MONTHS_OF_THE_YEAR = {
     "December": 31,
 }
 
+_MONTH_INDEX = {month: i for i, month in enumerate(MONTHS_OF_THE_YEAR)}
+_MONTHS = list(MONTHS_OF_THE_YEAR)
+
+# Days before each month in a common year, and in the fixed 366 day year used for ranges that repeat every year
+_DAYS_BEFORE_MONTH = {month: sum(([31, 28] + list(MONTHS_OF_THE_YEAR.values())[2:])[:i]) for i, month in enumerate(MONTHS_OF_THE_YEAR)}
+_YEAR_DAYS_BEFORE_MONTH = {month: sum(list(MONTHS_OF_THE_YEAR.values())[:i]) for i, month in enumerate(MONTHS_OF_THE_YEAR)}
+
+def is_leap_year(year: int):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+def days_in_month(month: str, year: int):
+    if month == "February":
+        return 29 if is_leap_year(year) else 28
+    
+    return MONTHS_OF_THE_YEAR[month]
+
+def days_since_epoch(date: int, month: str, year: int):
+    # Proleptic Gregorian days since 1st January of year 1, year 0 and earlier come out negative
+    y = year - 1
+    
+    return (
+        y * 365 + y // 4 - y // 100 + y // 400 +
+        _DAYS_BEFORE_MONTH[month] + (_MONTH_INDEX[month] > 1 and is_leap_year(year)) +
+        date - 1
+    )
+
 def positionify(number: int | str, default: str | None = ...):
     if isinstance(number, int):
         number = str(number)
@@ -31,17 +57,63 @@ def positionify(number: int | str, default: str | None = ...):
         
     return number + suffix
 
+_TIME_FIELDS = ("hour", "min", "sec")
+_PERIOD_FIELDS = ("time", "day", "date", "month", "year")
+_DATE_FIELDS = {"date", "month", "year"}
+
+_DAY_INDEX = {day: i for i, day in enumerate(DAYS_OF_THE_WEEK)}
+
+# Every Period shares these string objects for its day and month instead of holding its own copies
+_NAMES = {name: name for name in DAYS_OF_THE_WEEK + _MONTHS}
+
+def _drop_cached(obj, name: str):
+    try:
+        object.__delattr__(obj, name)
+    except AttributeError:
+        pass
+
+def _restore_state(obj, state: dict, names: tuple[str, ...]):
+    # .cdat files from before slots hold the old instance __dict__, cached values and all, only the fields are kept
+    for name in names:
+        setattr(obj, name, state[name])
+
 @dataclass
 class Time:
+    # Slots are listed by hand so the cached values get one without being dataclass fields (asdict, eq, repr).
+    # Neither is set until needed, the cached seconds and the days normalize carried over
+    __slots__ = _TIME_FIELDS + ("_seconds", "_carry")
+    
     hour: int
     min: int
     sec: float
     
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        
+        if name in _TIME_FIELDS:
+            _drop_cached(self, "_seconds")
+    
+    def __getattr__(self, name):
+        # Only runs when the cached value is missing, after construction, unpickling or a field assignment
+        if name == "_seconds":
+            seconds = self.sec + self.min * 60 + self.hour * 60 * 60
+            object.__setattr__(self, "_seconds", seconds)
+            
+            return seconds
+        
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+    
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in _TIME_FIELDS}
+    
+    def __setstate__(self, state: dict):
+        _restore_state(self, state, _TIME_FIELDS)
+    
     def __repr__(self):
         return self.to_str()
     
     def in_seconds(self):
-        return self.sec + self.min * 60 + self.hour * 60 * 60
+        return self._seconds
     
     def in_minutes(self):
         return self.in_seconds() / 60
@@ -109,23 +181,78 @@ def S_MONTH(month: str):
     return S_DAY * MONTHS_OF_THE_YEAR[month]
 S_YEAR = S_DAY * 365
 
-@dataclass
+@dataclass(eq=False)
 class Period:
+    __slots__ = _PERIOD_FIELDS + ("_days", )
+    
     time: Time
     day: str
     date: int
     month: str
     year: int
     
+    def __setattr__(self, name, value):
+        if name == "day" or name == "month":
+            value = _NAMES.get(value, value)
+        
+        object.__setattr__(self, name, value)
+        
+        if name in _DATE_FIELDS:
+            _drop_cached(self, "_days")
+    
+    def __getattr__(self, name):
+        if name == "_days":
+            days = days_since_epoch(self.date, self.month, self.year)
+            object.__setattr__(self, "_days", days)
+            
+            return days
+        
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+    
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in _PERIOD_FIELDS}
+    
+    def __setstate__(self, state: dict):
+        _restore_state(self, state, _PERIOD_FIELDS)
+    
     def __repr__(self):
         return self.to_str()
     
-    def in_seconds(self):
-        prev_months = list(MONTHS_OF_THE_YEAR.values())[:list(MONTHS_OF_THE_YEAR).index(self.month)] + [0]
-        
-        days = sum(prev_months) + self.date - 1
+    def __eq__(self, other):
+        if not isinstance(other, Period):
+            return NotImplemented
         
-        return self.time.in_seconds() + days * 24 * 60 * 60
+        return self._days * S_DAY + self.time._seconds == other._days * S_DAY + other.time._seconds
+    
+    def __lt__(self, other: "Period"):
+        return self._days * S_DAY + self.time._seconds < other._days * S_DAY + other.time._seconds
+    
+    def __le__(self, other: "Period"):
+        return self._days * S_DAY + self.time._seconds <= other._days * S_DAY + other.time._seconds
+    
+    def __gt__(self, other: "Period"):
+        return self._days * S_DAY + self.time._seconds > other._days * S_DAY + other.time._seconds
+    
+    def __ge__(self, other: "Period"):
+        return self._days * S_DAY + self.time._seconds >= other._days * S_DAY + other.time._seconds
+    
+    @property
+    def days(self) -> int:
+        return self._days
+    
+    @property
+    def day_index(self):
+        return _DAY_INDEX[self.day]
+    
+    @property
+    def month_index(self):
+        return _MONTH_INDEX[self.month]
+    
+    def in_seconds(self):
+        # Seconds since the start of year 1, the day part is cached until a date field is assigned
+        return self._days * S_DAY + self.time._seconds
+    
+    epoch = property(in_seconds)
     
     def in_minutes(self):
         return self.in_seconds() / 60
@@ -139,6 +266,17 @@ class Period:
     def in_weeks(self):
         return self.in_days() / 7
     
+    def in_year_seconds(self):
+        # Position within a fixed 366 day year, for ranges like the timeline dates that repeat every year
+        return (_YEAR_DAYS_BEFORE_MONTH[self.month] + self.date - 1) * S_DAY + self.time.in_seconds()
+    
+    def within(self, start: "Period", end: "Period"):
+        # Year 0 ranges repeat every year, any other range is a fixed stretch of time
+        if start.year == 0 and end.year == 0:
+            return start.in_year_seconds() <= self.in_year_seconds() <= end.in_year_seconds()
+        
+        return start <= self <= end
+    
     def normalize(self):
         self.time.normalize()
         
@@ -146,35 +284,32 @@ class Period:
         if hasattr(self.time, "_carry"):
             _time_carry = self.time._carry
         
-        self.date += _time_carry
-        
-        orig_date = self.date
+        # The weekday only moves with the days carried over, whatever months are crossed
+        self.day = DAYS_OF_THE_WEEK[(self.day_index + _time_carry) % 7]
         
-        m_list = list(MONTHS_OF_THE_YEAR)
+        date = self.date + _time_carry
+        month = self.month
+        year = self.year
         
-        m_index = m_list.index(self.month)
-        day_index = (DAYS_OF_THE_WEEK.index(self.day) + _time_carry) % 7
-        
-        self.day = DAYS_OF_THE_WEEK[day_index]
-        
-        if self.date > MONTHS_OF_THE_YEAR[self.month]:
-            self.date -= MONTHS_OF_THE_YEAR[self.month]
-            
-            self.month = m_list[(m_index + 1) % len(MONTHS_OF_THE_YEAR)]
+        while date > days_in_month(month, year):
+            date -= days_in_month(month, year)
             
-            if m_index == len(MONTHS_OF_THE_YEAR) - 1:
-                self.year += 1
+            if month == _MONTHS[-1]:
+                year += 1
             
-            self.day = DAYS_OF_THE_WEEK[(day_index + (MONTHS_OF_THE_YEAR[self.month] + self.date - orig_date) % 7) % 7]
-        elif self.date < 1:
-            self.date += MONTHS_OF_THE_YEAR[self.month]
-            
-            self.month = m_list[m_index - 1]
+            month = _MONTHS[(_MONTH_INDEX[month] + 1) % len(_MONTHS)]
+        
+        while date < 1:
+            if month == _MONTHS[0]:
+                year -= 1
             
-            if m_index == 0:
-                self.year -= 1
+            month = _MONTHS[_MONTH_INDEX[month] - 1]
             
-            self.day = DAYS_OF_THE_WEEK[(day_index - abs(orig_date - 1) % 7) % 7]
+            date += days_in_month(month, year)
+        
+        self.date = date
+        self.month = month
+        self.year = year
         
         if hasattr(self.time, "_carry"):
             del self.time._carry
@@ -1,7 +1,7 @@
 """All imports needed in main files"""
 
 # Utility Imports
-import os, sys, math, time, json, numpy, pickle, serial, socket, asyncio
+import os, sys, math, time, json, numpy, pickle, serial, socket, asyncio, threading
 from copy import deepcopy
 from typing import Any, Optional, Callable, Literal, TypeVar
 
@@ -17,7 +17,8 @@ from PyQt6.QtWidgets import (
     QScrollArea, QCheckBox, QSlider,
     QFrame, QLayout, QApplication,
     QDialog, QLineEdit, QMainWindow, QComboBox,
-    QFileDialog, QDial, QRadioButton, QMenu
+    QFileDialog, QDial, QRadioButton, QMenu,
+    QPlainTextEdit
 )
 from PyQt6.QtGui import (
     QIcon, QPixmap, QIntValidator,
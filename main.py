@@ -4,14 +4,20 @@ from widgets.staff.option_widgets import *
 from widgets.staff.list_widgets import *
 
 from theme import THEME_MANAGER
+from data.journal import Journal, load_journaled
+from data.database import DATABASE_SUFFIX, AttendanceDatabase, is_database
 
 import csv
 from io import StringIO
+from itertools import count
 from typing import List
 
 class Window(QMainWindow):
     comm_signal = pySignal(dict)
     connection_changed = pySignal(bool)
+    gate_connection_changed = pySignal(bool)
+    hub_connection_changed = pySignal(bool)
+    scanner_plugged = pySignal(str)
     saved_state_changed = pySignal(bool)
     
     def __init__(self, arguments: list[str]) -> None:
@@ -22,11 +28,38 @@ class Window(QMainWindow):
             "-d": self._default_flag,
             "-default": self._default_flag,
             
+            "-g": self._gate_flag,
+            "-gate": self._gate_flag,
+            
+            "-s": self._server_flag,
+            "-server": self._server_flag,
+            
+            "-c": self._capture_flag,
+            "-capture": self._capture_flag,
+            "-r": self._replay_flag,
+            "-replay": self._replay_flag,
+            "-rs": self._replay_speed_flag,
+            "-replay-speed": self._replay_speed_flag,
+            
+            "-dw": self._dedup_window_flag,
+            "-dedup-window": self._dedup_window_flag,
+            
+            "no-reconnect": self._no_reconnect_flag,
+            "eager-history": self._eager_history_flag,
+            
             "--arg--": self._arg_flags
         }
         
         self.file_path = None
         self._default_file_path = None
+        self._gates: list[CommDevice] = []
+        self._server_address = None
+        self._capture_path = None
+        self._replay_path = None
+        self._replay_speed = 1.0
+        self._dedup_window = 2.0
+        self._auto_reconnect = True
+        self._lazy_history = True
         self.arguments = arguments
         
         for i, arg in enumerate(self.arguments):
@@ -41,10 +74,30 @@ class Window(QMainWindow):
             elif i:
                 self.flag_mapping["--arg--"](i, arg)
         
-        self.target_connector = BaseCommSystem(CommDevice(self.comm_signal, self.connection_changed, "", None, None), self.connection_error_func)
+        self.target_connector = BaseCommSystem(CommDevice(self.comm_signal, self.connection_changed, "", None, None, dedup_window=self._dedup_window), self.connection_error_func)
         self.connection_set_up_screen = CommSetupDialog(self, self.target_connector)
+        self.target_connector.ble_discovery.start()
+        self.target_connector.port_watcher.start()
+        self.target_connector.set_replay(self._replay_path, self._replay_speed)
+        self.target_connector.auto_reconnect = self._auto_reconnect
+        
+        if self._capture_path is not None:
+            self.target_connector.start_capture(self._capture_path)
+        
+        self.comm_hub = ConnectionHub(self.hub_connection_changed)
+        self.comm_hub.add("Gate 1", self.target_connector)
+        
+        for i, gate in enumerate(self._gates, 2):
+            gate.dedup_window = self._dedup_window
+            self.comm_hub.add(f"Gate {i}", self._create_gate(f"Gate {i}", gate))
+        
+        self.latency_debug_screen = LatencyDebugDialog(self, self.comm_hub)
+        
+        self.scanner_server = None
+        if self._server_address is not None:
+            self.scanner_server = ScannerServer(self.target_connector.io_loop, DEVICE_KEY, self._server_address, self._network_gate)
         # self.management_set_up_screen = ManageSetupDialog(self)
-        self.file_manager = FileManager(self, self.file_path, "CDSSE Attendance Files (*.cdat)")
+        self.file_manager = FileManager(self, self.file_path, f"CDSSE Attendance Files (*.cdat);;CDSSE Attendance Databases (*{DATABASE_SUFFIX})")
         self.file_manager.set_callbacks(self.save_callback, self.open_callback, self.load_callback, self.csv_export_callback)
         
         self.create_menu_bar()
@@ -78,30 +131,51 @@ class Window(QMainWindow):
         else:
             self.file_manager.current_path = self.file_path
             self.data = self.file_manager.get_file_data()
+            self._open_journal(self.file_path)
+        
+        if self.data.duplicate_iuds:
+            QMessageBox.warning(
+                self,
+                "IUDError",
+                "Some cards are assigned to more than one staff, scans of them count for the first listed:\n\n" +
+                "\n".join(f"{IUD}: {', '.join(staff.name.full() for staff in holders)}" for IUD, holders in self.data.duplicate_iuds.items())
+            )
         
         # Create stacked widget for content
         main_widget = TabViewWidget("horizontal")
         
-        card_scan_widget = CardScanScreenWidget(self.data, self.target_connector, main_widget, self.saved_state_changed)
+        card_scan_widget = CardScanScreenWidget(self.data, self.comm_hub, main_widget, self.saved_state_changed)
         staff_data_widget = StaffDataWidget(self.data, main_widget)
         
         attendance_chart_widget = AttendanceBarWidget(self.data, staff_data_widget)
         punctuality_graph_widget = PunctualityGraphWidget(self.data, staff_data_widget)
         
-        main_widget.add("Attendance", AttendanceWidget(main_widget, self.data, attendance_chart_widget, punctuality_graph_widget, self.target_connector, self.saved_state_changed, self.file_manager, card_scan_widget))
-        main_widget.add("Staff", StaffListWidget(main_widget, self.data, self.target_connector, card_scan_widget, staff_data_widget))
+        self.attendance_widget = AttendanceWidget(main_widget, self.data, attendance_chart_widget, punctuality_graph_widget, self.comm_hub, self.saved_state_changed, self.file_manager, card_scan_widget, self._history_since())
+        
+        main_widget.add("Attendance", self.attendance_widget)
+        main_widget.add("Staff", StaffListWidget(main_widget, self.data, self.comm_hub, card_scan_widget, staff_data_widget))
         main_widget.add("Attendance Chart", attendance_chart_widget)
         main_widget.add("Punctuality Graph", punctuality_graph_widget)
         main_widget.stack.addWidget(card_scan_widget)
         main_widget.stack.addWidget(staff_data_widget)
         
         def conn_changed(connected):
-            if not connected:
+            if connected:
+                self.statusBar().clearMessage()
+            elif self.target_connector.reconnecting:
+                # The supervisor is bringing the link back, the dialog keeps its settings
+                self.statusBar().showMessage("Gate 1 link lost, reconnecting...")
+            else:
                 self.connection_set_up_screen.comm_disconnect()
         
         self.connection_set_up_screen.disconnect_button.clicked.connect(self.disconnect_connection)
         self.target_connector.device.connection_changed.connect(conn_changed)
+        self.target_connector.device.connection_changed.connect(self.comm_hub.link_changed)
+        self.gate_connection_changed.connect(self.gate_connection_changed_func)
         self.saved_state_changed.connect(self.saved_state_changed_func)
+        
+        self.scanner_plugged.connect(lambda port: self.statusBar().showMessage(f"Attendance scanner plugged in on {port}", 10000))
+        self.target_connector.port_watcher.add_plug_listener(lambda port: self.scanner_plugged.emit(port.name))
         self.target_connector.device.connection_changed.emit(False)
         
         main_layout.addWidget(main_widget)
@@ -109,6 +183,11 @@ class Window(QMainWindow):
         self.setCentralWidget(container)
         
         self.saved_state_changed.emit(True)
+        
+        self.comm_hub.start_all()
+        
+        if self.scanner_server is not None:
+            self.scanner_server.start()
     
     def _arg_flags(self, index: int, arg: str):
         assert index == len(self.arguments) - 1
@@ -118,6 +197,75 @@ class Window(QMainWindow):
     def _default_flag(self, arg: str):
         self._default_file_path = arg
     
+    def _gate_flag(self, arg: str):
+        # -g=COM3:9600 for a serial scanner, -g=bt:<address> for a bluetooth one
+        if arg.startswith("bt:"):
+            self._gates.append(CommDevice(self.comm_signal, self.gate_connection_changed, "", addr=arg[3:], pswd=DEVICE_KEY))
+        else:
+            port, baud_rate = arg.rsplit(":", 1)
+            self._gates.append(CommDevice(self.comm_signal, self.gate_connection_changed, port, baud_rate=int(baud_rate), pswd=DEVICE_KEY))
+    
+    def _server_flag(self, arg: str):
+        # -s=:5050 (or host:port) for TCP, -s=unix:/path/to/socket for a Unix domain socket
+        self._server_address = arg
+    
+    def _capture_flag(self, arg: str):
+        self._capture_path = arg
+    
+    def _replay_flag(self, arg: str):
+        self._replay_path = arg
+    
+    def _replay_speed_flag(self, arg: str):
+        # 1 replays in real time, 0 as fast as possible
+        self._replay_speed = float(arg)
+    
+    def _no_reconnect_flag(self):
+        self._auto_reconnect = False
+    
+    def _eager_history_flag(self):
+        self._lazy_history = False
+    
+    def _history_since(self):
+        # Start of the window loaded at startup, this year and the days of its first week that fall in December
+        if not self._lazy_history:
+            return None
+        
+        return (days_since_epoch(1, "January", Period.str_to_period(time.ctime()).year) - 7) * S_DAY
+    
+    def _dedup_window_flag(self, arg: str):
+        # Seconds a repeated IUD from the same gate is ignored for, 0 turns it off
+        self._dedup_window = float(arg)
+    
+    def _network_gate(self, peer: str, transport: StreamTransport, frame_mode: str):
+        # Gates reconnect from a new port every time, so they are named by host. Several live scanners on one host
+        # (or behind one NAT) each keep their own slot, a reconnecting one takes over the first slot whose link is dead
+        host = peer.rpartition(":")[0] or peer.partition("#")[0]
+        
+        for slot in count(1):
+            source = f"Net {host}" if slot == 1 else f"Net {host} #{slot}"
+            existing = self.comm_hub.systems.get(source)
+            
+            if existing is None:
+                break
+            
+            if not existing.connected:
+                self.comm_hub.remove(source, existing)
+                break
+        
+        gate = BaseCommSystem(CommDevice(self.comm_signal, self.gate_connection_changed, peer, pswd=DEVICE_KEY, dedup_window=self._dedup_window), lambda e: self.gate_error_func(source, e))
+        self.comm_hub.add(source, gate)
+        
+        gate.attach(transport, frame_mode).add_done_callback(lambda _: self.comm_hub.remove(source, gate))
+    
+    def _create_gate(self, source: str, device: CommDevice):
+        gate = BaseCommSystem(device, lambda e: self.gate_error_func(source, e))
+        
+        gate.auto_reconnect = self._auto_reconnect
+        gate.set_bluetooth(device.addr is not None)
+        gate.set_serial(device.addr is None)
+        
+        return gate
+    
     def saved_state_changed_func(self, value: bool):
         suffix = f" - {self.file_path}" + ("" if value else " *Unsaved")
         self.data.variables["saved"] = value
@@ -139,9 +287,28 @@ class Window(QMainWindow):
     def activate_connection_screen(self):
         self.connection_set_up_screen.exec()
     
+    def activate_latency_debug_screen(self):
+        self.latency_debug_screen.show()
+    
     # def activate_management_screen(self):
     #     self.management_set_up_screen.exec()
     
+    def gate_connection_changed_func(self, _):
+        # The extra gates share one signal, so the message lists each one's link from the hub
+        self.comm_hub.link_changed()
+        
+        links = ", ".join(f"{source} {"up" if connected else "down"}" for source, connected in self.comm_hub.link_states().items() if source != "Gate 1")
+        self.statusBar().showMessage(f"Gate links: {links}", 10000)
+    
+    def gate_error_func(self, source: str, e: Exception):
+        # Extra gates run unattended, a failing one must not block the others behind a dialog
+        gate = self.comm_hub.systems[source]
+        
+        if gate.connected:
+            gate.stop_connection()
+        
+        self.statusBar().showMessage(f"{source}: {type(e).__name__}: {e}", 10000)
+    
     def connection_error_func(self, e: Exception, conn_error: bool = True):
         self.target_connector.stop_connection()
         self.connection_set_up_screen.comm_disconnect()
@@ -183,6 +350,7 @@ class Window(QMainWindow):
         m_type_group.setExclusive(True)
         
         connection_menu.addAction("Device Connection", "Ctrl+D", self.activate_connection_screen)
+        connection_menu.addAction("Comm Latency", "Ctrl+L", self.activate_latency_debug_screen)
         connection_menu.addSeparator()
         
         c_sa_action = QAction("School Attendance", self)
@@ -250,6 +418,8 @@ class Window(QMainWindow):
             "Check Type",
             "Has Duties"
         ])
+        
+        self.attendance_widget.load_history()
 
         for entry in self.data.attendance_data:
             writer.writerow([
@@ -267,13 +437,30 @@ class Window(QMainWindow):
         with open(file_path, "w", newline="", encoding="utf-8") as file:
             file.write(output.getvalue().strip())
     
+    def _open_journal(self, file_path: str, new: bool = False):
+        if self.data.journal is not None:
+            self.data.journal.close()
+        
+        # A .cdb file takes the changes itself, a .cdat snapshot gets a journal beside it
+        if file_path.endswith(DATABASE_SUFFIX) or not new and is_database(file_path):
+            self.data.attach_journal(AttendanceDatabase(file_path, new))
+        else:
+            self.data.attach_journal(Journal(file_path, self.data.journal_seq))
+    
     def save_callback(self, file_path: str):
         self.file_path = file_path
         
         self.saved_state_changed.emit(True)
         
-        with open(self.file_path, "wb") as f:
-            pickle.dump(self.data, f)
+        # A full save has to include the history not loaded yet
+        self.attendance_widget.load_history()
+        
+        if self.data.journal is None or self.data.journal.path != file_path:
+            # Save As writes the whole file afresh, so saving a .cdat as a .cdb imports it and the other way round exports it
+            self._open_journal(file_path, True)
+        
+        # A full snapshot, scans after it go to the journal until the next save or compaction
+        self.data.checkpoint()
     
     def open_callback(self, file_path: str | None = None):
         new_window = Window(["", file_path])
@@ -284,8 +471,15 @@ class Window(QMainWindow):
         self._windows.append(new_window)
     
     def load_callback(self, file_path):
-        with open(file_path, "rb") as f:
-            return pickle.load(f)
+        if is_database(file_path):
+            database = AttendanceDatabase(file_path)
+            
+            try:
+                return database.load(self._history_since())
+            finally:
+                database.close()
+        
+        return load_journaled(file_path)
     
     def closeEvent(self, a0):
         if not self.data.variables["saved"]:
@@ -297,6 +491,15 @@ class Window(QMainWindow):
                 a0.ignore()
                 return
         
+        if self.scanner_server is not None:
+            self.scanner_server.stop()
+        
+        self.comm_hub.stop_all()
+        self.target_connector.stop_capture()
+        
+        if self.data.journal is not None:
+            self.data.journal.close()
+        
         a0.accept()
         
         return super().closeEvent(a0)
@@ -242,7 +242,7 @@ class BaseDataDisplayWidget(BaseScrollListWidget):
     
     @staticmethod
     def is_entry_countable(entry: AttendanceEntry, valid_days: list[str], timeline_dates: list[tuple[Period, Period]]):
-        time_line_index = next((i for i, t_d in enumerate(timeline_dates) if t_d[0].in_minutes() <= entry.period.in_minutes() <= t_d[1].in_minutes()), None)
+        time_line_index = next((i for i, t_d in enumerate(timeline_dates) if entry.period.within(*t_d)), None)
         
         if (
             entry.is_check_in and
@@ -280,7 +280,7 @@ class BaseDialogWidget(QDialog):
 
 
 class BaseStaffListEntryWidget(QWidget):
-    def __init__(self, parent_widget: TabViewWidget, data: AppData, staff: Staff, comm_system: BaseCommSystem, card_scanner_widget: QWidget, staff_data_widget: QWidget):
+    def __init__(self, parent_widget: TabViewWidget, data: AppData, staff: Staff, comm_system: ConnectionHub, card_scanner_widget: QWidget, staff_data_widget: QWidget):
         super().__init__()
         
         self.data = data
@@ -2,8 +2,9 @@ from widgets.base_widgets import *
 
 
 class CommSetupDialog(BaseDialogWidget):
-    update_signal = pySignal(dict, list)
     bluetooth_state_signal = pySignal(bool)
+    bt_devices_signal = pySignal(list)
+    ser_ports_signal = pySignal(list)
     
     def __init__(self, parent: QMainWindow, connector: BaseCommSystem):
         super().__init__(parent, "Device Connection Configuration")
@@ -26,12 +27,8 @@ class CommSetupDialog(BaseDialogWidget):
         
         _, serial_upper_buttons_layout = create_widget(serial_layout, QHBoxLayout)
         
-        def bt_state_signal():
-            self.refresh("ser", self.serial_refresh_button)
-            self.bluetooth_state_signal.emit(True)
-        
         self.serial_refresh_button = QPushButton("Refresh")
-        self.serial_refresh_button.clicked.connect(bt_state_signal)
+        self.serial_refresh_button.clicked.connect(self.serial_refresh)
         
         connect_button = QPushButton("Connect")
         connect_button.clicked.connect(self.serial_connect_clicked(-1))
@@ -66,7 +63,7 @@ class CommSetupDialog(BaseDialogWidget):
         serial_baud_rate_layout.addWidget(self.baud_rate_selector_widget)
         
         self.bluetooth_refesh_button = QPushButton("Refresh")
-        self.bluetooth_refesh_button.clicked.connect(lambda: self.refresh("bt", self.bluetooth_refesh_button))
+        self.bluetooth_refesh_button.clicked.connect(self.bt_refresh)
         
         bluetooth_layout.addWidget(self.bluetooth_refesh_button, alignment=Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
         
@@ -100,10 +97,16 @@ class CommSetupDialog(BaseDialogWidget):
             bluetooth_widget.setDisabled(not value)
             self.bluetooth_refesh_button.setDisabled(False)
         
-        self.update_signal.connect(self._update_scan_timeout)
         self.bluetooth_state_signal.connect(bt_state_signal_func)
         
-        self.refresh_tracker = {}
+        # Devices stream in from the background discovery as they are seen
+        self.bt_devices_signal.connect(lambda devices: self._update_scan_timeout({"bt": devices}))
+        self.connector.ble_discovery.add_listener(self.bt_devices_signal.emit)
+        self.connector.ble_discovery.add_error_listener(lambda _: self.bluetooth_state_signal.emit(False))
+        
+        # Ports are pushed by the watcher as they are plugged and unplugged
+        self.ser_ports_signal.connect(lambda ports: self._update_scan_timeout({"ser": ports}))
+        self.connector.port_watcher.add_listener(self.ser_ports_signal.emit)
     
     def comm_disconnect(self):
         self.data = {}
@@ -114,17 +117,15 @@ class CommSetupDialog(BaseDialogWidget):
         
         self.disconnect_button.setDisabled(True)
     
-    def refresh(self, refresh_type: str, refresh_button: QPushButton):
-        if self.refresh_tracker.get(refresh_type, [True, None])[0]:
-            if not self.refresh_tracker.get(refresh_type, False):
-                self.refresh_tracker[refresh_type] = [False, None]
-            
-            self.refresh_tracker[refresh_type][0] = False
-            refresh_button.setDisabled(True)
-            
-            self.refresh_tracker[refresh_type][1] = Thread(lambda: self.update_scans(refresh_type, refresh_type, refresh_button))
-            self.refresh_tracker[refresh_type][1].crashed.connect(self.parent().connection_error_func)
-            self.refresh_tracker[refresh_type][1].start()
+    def serial_refresh(self):
+        self.bluetooth_state_signal.emit(True)
+        
+        self._update_scan_timeout({"ser": self.connector.find_devices("ser")})
+    
+    def bt_refresh(self):
+        self.bluetooth_state_signal.emit(True)
+        
+        self._update_scan_timeout({"bt": self.connector.find_devices("bt")})
     
     def exec(self):
         self.serial_refresh_button.click()
@@ -132,7 +133,7 @@ class CommSetupDialog(BaseDialogWidget):
         
         initial_exec_val = super().exec()
         
-        if not self.connector.connected:
+        if not self.connector.connected and not self.connector.reconnecting:
             self.connector.device.port = self.data.get("port", "")
             self.connector.device.addr = self.data.get("addr")
             self.connector.device.baud_rate = self.data.get("baud_rate")
@@ -146,13 +147,7 @@ class CommSetupDialog(BaseDialogWidget):
         
         return initial_exec_val
     
-    def _update_scan_timeout(self, data: dict[str, list[tuple[str, str]] | list[str]], args: list):
-        if not args:
-            refresh_type = None
-            refresh_button = None
-        else:
-            refresh_type, refresh_button = args
-        
+    def _update_scan_timeout(self, data: dict[str, list[tuple[str, str]] | list[str]]):
         if data.get("ser", None) is not None and self.port_options != data["ser"]:
             self.port_options = data["ser"]
             
@@ -181,23 +176,6 @@ class CommSetupDialog(BaseDialogWidget):
             
             for index, (addr, name) in enumerate(self.bluetooth_devices):
                 self.add_bt_device(name, addr, index)
-        
-        if refresh_button is not None:
-            refresh_button.setDisabled(False)
-        if refresh_type is not None:
-            self.refresh_tracker[refresh_type][0] = True
-    
-    def update_scans(self, send_type: str | None = None, *args):
-        data = {}
-        
-        if send_type == "bt" or send_type is None:
-            bt_data = self.connector.find_devices("bt")
-            data["bt"] = bt_data
-        elif send_type == "ser" or send_type is None:
-            ser_data = self.connector.find_devices("ser")
-            data["ser"] = ser_data
-        
-        self.update_signal.emit(data, args)
     
     def add_bt_device(self, name: str, addr: str, index: int):
         connect_button = QPushButton("Connect")
@@ -223,7 +201,7 @@ class CommSetupDialog(BaseDialogWidget):
             self.connect_clicked = True
             self.connected = True
             
-            self.data["key"] = "83ab579eee7f8a98c765"
+            self.data["key"] = DEVICE_KEY
             
             if a0 == -1:
                 self.data["connection-type"] = "ser"
@@ -265,6 +243,70 @@ class CommSetupDialog(BaseDialogWidget):
         return super().closeEvent(a0)
 
 
+class LatencyDebugDialog(BaseDialogWidget):
+    def __init__(self, parent: QMainWindow, comm_hub: ConnectionHub):
+        super().__init__(parent, "Comm Latency")
+        
+        # Meant to stay open next to the main window while scans come in
+        self.setModal(False)
+        
+        self.comm_hub = comm_hub
+        self.tracker = get_latency_tracker()
+        
+        self.stats_view = QPlainTextEdit()
+        self.stats_view.setReadOnly(True)
+        self.stats_view.setStyleSheet("font-family: consolas, monospace;")
+        
+        _, buttons_layout = create_widget(self.main_layout, QHBoxLayout)
+        
+        reset_button = QPushButton("Reset")
+        reset_button.clicked.connect(self.reset)
+        
+        dump_button = QPushButton("Dump to File")
+        dump_button.clicked.connect(self.dump)
+        
+        buttons_layout.addWidget(reset_button, alignment=Qt.AlignmentFlag.AlignLeft)
+        buttons_layout.addWidget(dump_button, alignment=Qt.AlignmentFlag.AlignRight)
+        
+        self.main_layout.addWidget(self.stats_view)
+        
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+    
+    def refresh(self):
+        lines = [self.tracker.to_str(), ""]
+        
+        for source, stats in self.comm_hub.device_stats().items():
+            lines.append(
+                f"{source:<16}{'up' if stats['connected'] else 'reconnecting' if stats['reconnecting'] else 'down':<14}"
+                f"{stats['frames_per_sec']:>7.1f} frames/s  ingest {stats['ingest_latency_ms']:.2f} ms  "
+                f"handshake {stats['handshake_ms']:.0f} ms  dedup dropped {stats['dedup']['dropped']}  queue {stats['queue']['depth']}"
+            )
+        
+        self.stats_view.setPlainText("\n".join(lines))
+    
+    def reset(self):
+        self.tracker.reset()
+        self.refresh()
+    
+    def dump(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Dump Latency Stats", "", "JSON Files (*.json)")
+        
+        if file_path:
+            self.tracker.dump(file_path)
+    
+    def showEvent(self, a0):
+        self.refresh()
+        self.refresh_timer.start(1000)
+        
+        return super().showEvent(a0)
+    
+    def hideEvent(self, a0):
+        self.refresh_timer.stop()
+        
+        return super().hideEvent(a0)
+
+
 # class ManageSetupDialog(BaseDialogWidget):
 #     def __init__(self, parent):
 #         super().__init__(parent, "Management Mode")
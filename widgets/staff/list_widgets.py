@@ -9,9 +9,13 @@ from widgets.data_display_widgets import *
 
 
 class AttendanceWidget(BaseScrollListWidget):
-    comm_signal = pySignal(str)
+    scan_batch_signal = pySignal()
     
-    def __init__(self, parent_widget: TabViewWidget, data: AppData, attendance_chart_widget: "AttendanceBarWidget", punctuality_graph_widget: "PunctualityGraphWidget", comm_system: BaseCommSystem, saved_state_changed: pyBoundSignal, file_manager: FileManager, card_scanner_widget: CardScanScreenWidget):
+    # Entries the prefetcher turns into widgets per tick, and how often it ticks in milliseconds
+    history_chunk = 200
+    history_interval = 20
+    
+    def __init__(self, parent_widget: TabViewWidget, data: AppData, attendance_chart_widget: "AttendanceBarWidget", punctuality_graph_widget: "PunctualityGraphWidget", comm_system: ConnectionHub, saved_state_changed: pyBoundSignal, file_manager: FileManager, card_scanner_widget: CardScanScreenWidget, history_since: float | None = None):
         super().__init__()
         
         self.kb_dbg_action_mapping = {}
@@ -60,7 +64,10 @@ class AttendanceWidget(BaseScrollListWidget):
         self.stack = QStackedWidget()
         
         cperiod = Period.str_to_period(time.ctime())
-        self.other_years = sorted(set([str(att.period.year) for att in self.data.attendance_data if att.period.year not in (cperiod.year, cperiod.year - 1)]))
+        self.other_years = [str(year) for year in self.data.years() if year not in (cperiod.year, cperiod.year - 1)]
+        
+        # Entries before history_size are older than history_since, views that cannot show them start after them
+        self.history_size = self.data.attendance_data.first_since(history_since) if history_since is not None else 0
         
         self.filter_views = {}
         self.scr_bar_values = []
@@ -78,15 +85,18 @@ class AttendanceWidget(BaseScrollListWidget):
             
             self.stack.addWidget(widget)
             
-            self.filter_views[comb] = [widget, len(self.data.attendance_data)]
+            # The index of the next entry the view has not been shown yet, None until it is first shown
+            self.filter_views[comb] = [widget, None]
             self.scr_bar_values.append(0)
         
         self.main_layout.addWidget(self.stack)
         
         self.main_layout.addStretch()
         
-        self.comm_signal.connect(self.add_new_attendance_log)
-        self.comm_system.set_data_point("IUD", self.comm_signal)
+        self.latency_tracker = get_latency_tracker()
+        self.scan_buffer = IngestBuffer(self.scan_batch_signal.emit)
+        self.scan_batch_signal.connect(lambda: self.add_new_attendance_logs(self.scan_buffer.drain()))
+        self.comm_system.set_data_point("IUD", self.scan_buffer)
         
         self.time_label = QLabel()
         self.filter_widget, filter_layout = create_widget(None, QHBoxLayout)
@@ -119,8 +129,24 @@ class AttendanceWidget(BaseScrollListWidget):
         
         self.filter_comboboxes[0].setCurrentIndex(0)
         
-        for i, attendance in enumerate(self.data.attendance_data):
-            self._add_attendance_log(attendance, i)
+        # The first view opens with the recent entries only, the prefetcher swaps in a full one once it is built
+        start_comb = tuple(c.currentIndex() for c in self.filter_comboboxes)
+        self.filter_views[start_comb][1] = self.history_size
+        last_widget = self._fill_view(start_comb)
+        
+        if len(self.data.attendance_data):
+            self._data_changed()
+        if last_widget is not None:
+            self.scroll_to(last_widget, is_first=True)
+        
+        self._partial_comb = start_comb if self.history_size or self.data.history_pending() else None
+        self._prefetch_view = None
+        
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.timeout.connect(self._prefetch_history)
+        
+        if self._partial_comb is not None:
+            self.prefetch_timer.start(self.history_interval)
         
         self._layout.insertWidget(0, self.filter_widget)
         
@@ -227,7 +253,7 @@ class AttendanceWidget(BaseScrollListWidget):
     def _determine_filter_widget_type(self, comb: tuple[int, ...]):
         return BaseListWidget(self.scroll_widget) if comb[1] in (0, 1) and comb[2] in (0, ) else BaseFilterCategoriesWidget(self.scroll_widget)
     
-    def _add_attendance_entry(self, comb: tuple[int, ...], t_widget_entry: AttendanceEntry):
+    def _add_attendance_entry(self, comb: tuple[int, ...], t_widget_entry: AttendanceEntry, parent_widg: BaseListWidget | None = None):
         if isinstance(t_widget_entry.staff, Teacher):
             t_widget = AttendanceTeacherEntryWidget(t_widget_entry)
         elif isinstance(t_widget_entry.staff, Prefect):
@@ -235,7 +261,8 @@ class AttendanceWidget(BaseScrollListWidget):
         else:
             raise TypeError(f"Type: {type(t_widget_entry.staff)} is not supported")
         
-        parent_widg, _ = self.filter_views[comb]
+        if parent_widg is None:
+            parent_widg, _ = self.filter_views[comb]
         
         accepted, cls = self.filter(t_widget, comb)
         
@@ -247,12 +274,9 @@ class AttendanceWidget(BaseScrollListWidget):
     def _make_c_change_func(self, index: int):
         def func(i):
             comb = tuple((c.currentIndex() if c_i != index else i) for c_i, c in enumerate(self.filter_comboboxes))
-            widg, att_i = self.filter_views[comb]
-            
-            for att_entry in self.data.attendance_data[att_i:]:
-                self._add_attendance_entry(comb, att_entry)
             
-            self.filter_views[comb][1] = len(self.data.attendance_data)
+            self._fill_view(comb)
+            widg, _ = self.filter_views[comb]
             
             self.scr_bar_values[self.stack.currentIndex()] = self.scroll_widget.verticalScrollBar().value()
             
@@ -313,37 +337,141 @@ class AttendanceWidget(BaseScrollListWidget):
         
         raise Exception()
     
-    def _add_attendance_log(self, attendance_entry: AttendanceEntry, index=None):
-        if isinstance(attendance_entry.staff, Teacher):
+    def _needs_history(self, comb: tuple[int, ...]):
+        # Today, this week, this month and this year never reach past history_since
+        return comb[1] not in (1, 2, 3, 4)
+    
+    def _fill_view(self, comb: tuple[int, ...]):
+        _, att_i = self.filter_views[comb]
+        
+        if att_i is None:
+            if self._needs_history(comb):
+                self.load_history()
+                att_i = 0
+            else:
+                att_i = self.history_size
+        
+        t_widget = None
+        
+        self.setUpdatesEnabled(False)
+        
+        for att_entry in self.data.attendance_data[att_i:]:
+            t_widget = self._add_attendance_entry(comb, att_entry)
+        
+        self.setUpdatesEnabled(True)
+        
+        self.filter_views[comb][1] = len(self.data.attendance_data)
+        
+        return t_widget
+    
+    def _data_changed(self):
+        self.attendance_chart_widget.teacher_data_changed()
+        self.punctuality_graph_widget.teacher_data_changed()
+        self.attendance_chart_widget.prefect_data_changed()
+        self.punctuality_graph_widget.prefect_data_changed()
+    
+    def load_history(self):
+        # Puts the deferred older entries in front of the loaded ones, the views' places in the store move with them
+        count = self.data.load_history()
+        
+        if not count:
+            return
+        
+        self.history_size += count
+        
+        for view in self.filter_views.values():
+            if view[1] is not None:
+                view[1] += count
+        
+        self._data_changed()
+    
+    def _prefetch_history(self):
+        # Runs on a timer a chunk at a time, so the window stays responsive while the full first view is built
+        if not self.data.history_ready():
+            return
+        
+        try:
+            self.load_history()
+        except Exception as e:
+            # The history stays deferred, so a save still refuses to drop it
+            self.prefetch_timer.stop()
+            QMessageBox.warning(self.parent_widget, type(e).__name__, f"Older attendance history could not be loaded:\n\n{e}")
+            return
+        
+        comb = self._partial_comb
+        
+        if self._prefetch_view is None:
+            # Built at the back of the stack so the other views keep their indexes
+            self._prefetch_view = [self._determine_filter_widget_type(comb), 0]
+            self.stack.addWidget(self._prefetch_view[0])
+        
+        widget, built = self._prefetch_view
+        entries = self.data.attendance_data[built:built + self.history_chunk]
+        
+        for entry in entries:
+            self._add_attendance_entry(comb, entry, widget)
+        
+        self._prefetch_view[1] = built = built + len(entries)
+        
+        if built < len(self.data.attendance_data):
+            return
+        
+        self.prefetch_timer.stop()
+        
+        old_widget, _ = self.filter_views[comb]
+        index = self.stack.indexOf(old_widget)
+        
+        self.stack.removeWidget(widget)
+        self.stack.insertWidget(index, widget)
+        
+        if self.stack.currentWidget() is old_widget:
+            # Kept the same distance from the bottom, where the latest scans are
+            scroll_bar = self.scroll_widget.verticalScrollBar()
+            from_bottom = scroll_bar.maximum() - scroll_bar.value()
+            
+            self.stack.setCurrentWidget(widget)
+            QTimer.singleShot(0, lambda: scroll_bar.setValue(scroll_bar.maximum() - from_bottom))
+        
+        self.stack.removeWidget(old_widget)
+        old_widget.deleteLater()
+        
+        self.filter_views[comb] = [widget, built]
+        self._partial_comb = None
+        self._prefetch_view = None
+    
+    def _add_attendance_logs(self, attendance_entries: list[AttendanceEntry]):
+        # A whole batch of scans costs one chart refresh and one scroll
+        if any(isinstance(entry.staff, Teacher) for entry in attendance_entries):
             self.attendance_chart_widget.teacher_data_changed()
             self.punctuality_graph_widget.teacher_data_changed()
-        elif isinstance(attendance_entry.staff, Prefect):
+        if any(isinstance(entry.staff, Prefect) for entry in attendance_entries):
             self.attendance_chart_widget.prefect_data_changed()
             self.punctuality_graph_widget.prefect_data_changed()
-        else:
-            raise TypeError(f"Type: {type(attendance_entry.staff)} is not supported")
         
         self.saved_state_changed.emit(False)
         
         curr_widget = self.stack.currentWidget()
+        index = len(self.data.attendance_data) - len(attendance_entries)
         
-        if index is not None:
-            widg_comb = None
-            
-            for comb, (widget, _) in self.filter_views.items():
-                if widget == curr_widget:
-                    widg_comb = comb
-                    self.filter_views[comb][1] = len(self.data.attendance_data)
-                elif index < self.filter_views[comb][1]:
-                    self.filter_views[comb][1] = index
-            
-            assert widg_comb
-            
-            widget = self._add_attendance_entry(widg_comb, attendance_entry)
-            self.scroll_to(widget, is_first=index==0)
-        else:
-            for comb, (widget, _) in self.filter_views.items():
-                self._add_attendance_entry(comb, attendance_entry)
+        widg_comb = None
+        
+        for comb, (widget, _) in self.filter_views.items():
+            if widget == curr_widget:
+                widg_comb = comb
+                self.filter_views[comb][1] = len(self.data.attendance_data)
+            elif self.filter_views[comb][1] is not None and index < self.filter_views[comb][1]:
+                self.filter_views[comb][1] = index
+        
+        assert widg_comb
+        
+        self.setUpdatesEnabled(False)
+        
+        for entry in attendance_entries:
+            widget = self._add_attendance_entry(widg_comb, entry)
+        
+        self.setUpdatesEnabled(True)
+        
+        self.scroll_to(widget, is_first=index==0)
     
     def _random_period(self):
         period = Period.str_to_period(time.ctime())
@@ -571,19 +699,64 @@ class AttendanceWidget(BaseScrollListWidget):
         
         self.main_layout.insertWidget(0, time_widget)
     
-    def add_new_attendance_log(self, IUD: str, period: Period | None = None):
+    def add_new_attendance_log(self, IUD: str, period: Period | None = None, source: str | None = None):
+        with self.latency_tracker.handling(IUD) as trace:
+            entry, error = self._process_scan(IUD, period, source)
+        
+        if entry is not None:
+            self._add_attendance_logs([entry])
+            self._persist([trace])
+        
+        if error is not None:
+            QMessageBox.warning(self.parent_widget, *error)
+    
+    def add_new_attendance_logs(self, scans: list[tuple[str, str]]):
+        entries = []
+        errors = []
+        
+        traces = []
+        
+        for IUD, source in scans:
+            with self.latency_tracker.handling(IUD) as trace:
+                entry, error = self._process_scan(IUD, source=source)
+            
+            traces.append(trace)
+            
+            if entry is not None:
+                entries.append(entry)
+            if error is not None:
+                errors.append(error)
+        
+        if entries:
+            self._add_attendance_logs(entries)
+            self._persist(traces)
+        
+        # Warnings wait until the batch is applied, their event loop can deliver the next batch
+        if len(errors) == 1:
+            QMessageBox.warning(self.parent_widget, *errors[0])
+        elif errors:
+            QMessageBox.warning(self.parent_widget, "CardScannerError", "\n".join(message for _, message in errors))
+    
+    def _persist(self, traces: list):
+        if self.data.journal is not None:
+            # The entries went into the journal as they were added, its writer syncs them to disk in batches
+            self.saved_state_changed.emit(self.data.journaled())
+        elif self.file_manager.current_path is not None:
+            self.file_manager.save()
+        else:
+            return
+        
+        for trace in traces:
+            self.latency_tracker.stamp(trace, "saved")
+    
+    def _process_scan(self, IUD: str, period: Period | None = None, source: str | None = None) -> tuple[AttendanceEntry | None, tuple[str, str] | None]:
         if not self.card_scanner_widget.just_scanned:
-            staff = next((prefect for _, prefect in self.data.prefects.items() if prefect.IUD == IUD), None)
+            staff = self.data.staff_by_iud(IUD)
             
             if staff is None:
-                staff = next((teacher for _, teacher in self.data.teachers.items() if teacher.IUD == IUD), None)
+                self.comm_system.send_message(f"UNREGISTERED", source=source)
                 
-                if staff is None:
-                    self.comm_system.send_message(f"UNREGISTERED")
-                    
-                    QMessageBox.warning(self.parent_widget, "CardScannerError", f"No staff is linked to this card (IUD: {IUD})")
-                    
-                    return
+                return None, ("CardScannerError", f"No staff is linked to this card (IUD: {IUD})")
             
             for k, v in self.cs_dbg_action_mapping.items():
                 if k.lower() in ("period", IUD.lower()):
@@ -594,7 +767,9 @@ class AttendanceWidget(BaseScrollListWidget):
             else:
                 period = period or Period.str_to_period(time.ctime())
             
-            previous_check_in = next((entry.is_check_in for entry in staff.attendance if entry.period.date == period.date and entry.period.month == period.month and entry.period.year == period.year), None)
+            # The latest scan of the day decides whether this one checks in or out
+            latest = self.data.attendance_data.latest_of_day(staff, period)
+            previous_check_in = latest.is_check_in if latest is not None else None
             cin, cout = (self.data.prefect_cit, self.data.prefect_cot) if isinstance(staff, Prefect) else (self.data.teacher_cit, self.data.teacher_cot)
             
             cin_interval = self.data.prefect_cin_border_interval_minutes if isinstance(staff, Prefect) else self.data.teacher_cin_border_interval_minutes
@@ -642,32 +817,21 @@ class AttendanceWidget(BaseScrollListWidget):
                     scan_failed_msg = "Check-In time is too early"
             
             if scan_failed_msg:
-                self.comm_system.send_message(f"UNSCANNED")
-                
-                QTimer.singleShot(
-                    500,
-                    lambda: self.comm_system.send_message(f"    Invalid     _    {send_msg}")
-                )
+                self.comm_system.send_message(f"UNSCANNED", source=source)
+                self.comm_system.send_message(f"    Invalid     _    {send_msg}", delay=0.5, source=source)
                 
-                QMessageBox.warning(self.parent_widget, f"{send_msg.replace("-", "")}Error", scan_failed_msg)
-                
-                return
+                return None, (f"{send_msg.replace("-", "")}Error", scan_failed_msg)
             
             entry = AttendanceEntry(period, staff, is_check_in)
             
-            self.data.attendance_data.append(entry)
-            staff.attendance.append(entry)
-            
-            self._add_attendance_log(entry, len(self.data.attendance_data) - 1)
+            self.data.add_attendance(entry, source)
             
-            self.comm_system.send_message(f"SCANNED")
-            QTimer.singleShot(
-                500,
-                lambda: self.comm_system.send_message(f"   Good{' morning' if is_check_in else "bye"}" + "_"+ (" " * int(8 - (len(entry.staff.name.abrev) / 2))) + f"{entry.staff.name.abrev}")
-            )
+            self.comm_system.send_message(f"SCANNED", source=source)
+            self.comm_system.send_message(f"   Good{' morning' if is_check_in else "bye"}" + "_"+ (" " * int(8 - (len(entry.staff.name.abrev) / 2))) + f"{entry.staff.name.abrev}", delay=0.5, source=source)
             
-            if self.file_manager.current_path is not None:
-                self.file_manager.save()
+            return entry, None
+        
+        return None, None
     
     def keyPressEvent(self, a0):
         period = Period.str_to_period(time.ctime())
@@ -684,7 +848,7 @@ class AttendanceWidget(BaseScrollListWidget):
         return super().keyPressEvent(a0)
 
 class StaffListWidget(BaseScrollListWidget):
-    def __init__(self, parent_widget: TabViewWidget, data: AppData, comm_system: BaseCommSystem, card_scanner_widget: CardScanScreenWidget, staff_data_widget: StaffDataWidget):
+    def __init__(self, parent_widget: TabViewWidget, data: AppData, comm_system: ConnectionHub, card_scanner_widget: CardScanScreenWidget, staff_data_widget: StaffDataWidget):
         super().__init__()
         
         self.data = data
@@ -932,7 +1096,8 @@ class PunctualityGraphWidget(BaseDataDisplayWidget):
         else:
             raise Exception()
         
-        y_plot_points = [cit.in_minutes() - attendance.period.time.in_minutes() for attendance in staff.attendance if BaseDataDisplayWidget.is_entry_countable(attendance, working_days, timeline_dates) is not None]
+        countable = self.data.attendance_data.countable_mask(working_days, timeline_dates, staff)
+        y_plot_points = ((cit.in_seconds() - self.data.attendance_data.day_seconds[countable]) / 60).tolist()
         
         if y_plot_points:
             return staff.name.abrev, y_plot_points
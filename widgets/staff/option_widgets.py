@@ -53,34 +53,35 @@ class StaffDataWidget(BaseOptionsWidget):
         
         weeks_data = {}
         
-        for attendance in staff.attendance:
-            if BaseDataDisplayWidget.is_entry_countable(attendance, self.staff_working_days[staff.id], timeline_dates) is not None:
-                curr_index = DAYS_OF_THE_WEEK.index(attendance.period.day)
-                
-                days = self.staff_working_days[staff.id]
-                
-                if attendance.period.date - curr_index < 1:
-                    start_date = 1
-                    days = [day for day in days if not (DAYS_OF_THE_WEEK.index(day) < abs(attendance.period.date - curr_index) + 1)]
-                else:
-                    start_date = attendance.period.date - curr_index
-                
-                if attendance.period.date - curr_index + 6 > MONTHS_OF_THE_YEAR[attendance.period.month]:
-                    end_date = MONTHS_OF_THE_YEAR[attendance.period.month]
-                    days = [day for day in days if not (DAYS_OF_THE_WEEK.index(day) > MONTHS_OF_THE_YEAR[attendance.period.month] - (attendance.period.date - curr_index))]
-                else:
-                    end_date = attendance.period.date - curr_index + 6
-                
-                if start_date != end_date:
-                    name_key = f"{attendance.period.month} {attendance.period.year}\n{positionify(start_date)} to {positionify(end_date)}"
-                else:
-                    name_key = f"{attendance.period.year}\n{positionify(start_date)} {attendance.period.month}"
+        countable = self.data.attendance_data.countable_mask(self.staff_working_days[staff.id], timeline_dates, staff)
+        
+        for attendance in self.data.attendance_data.select(countable):
+            curr_index = DAYS_OF_THE_WEEK.index(attendance.period.day)
+            
+            days = self.staff_working_days[staff.id]
+            
+            if attendance.period.date - curr_index < 1:
+                start_date = 1
+                days = [day for day in days if not (DAYS_OF_THE_WEEK.index(day) < abs(attendance.period.date - curr_index) + 1)]
+            else:
+                start_date = attendance.period.date - curr_index
+            
+            if attendance.period.date - curr_index + 6 > MONTHS_OF_THE_YEAR[attendance.period.month]:
+                end_date = MONTHS_OF_THE_YEAR[attendance.period.month]
+                days = [day for day in days if not (DAYS_OF_THE_WEEK.index(day) > MONTHS_OF_THE_YEAR[attendance.period.month] - (attendance.period.date - curr_index))]
+            else:
+                end_date = attendance.period.date - curr_index + 6
+            
+            if start_date != end_date:
+                name_key = f"{attendance.period.month} {attendance.period.year}\n{positionify(start_date)} to {positionify(end_date)}"
+            else:
+                name_key = f"{attendance.period.year}\n{positionify(start_date)} {attendance.period.month}"
+            
+            if days:
+                if name_key not in weeks_data:
+                    weeks_data[name_key] = [0, len(days)]
                 
-                if days:
-                    if name_key not in weeks_data:
-                        weeks_data[name_key] = [0, len(days)]
-                    
-                    weeks_data[name_key][0] += 1
+                weeks_data[name_key][0] += 1
         
         return weeks_data, {key: amt_attended / total * 100 for key, (amt_attended, total) in weeks_data.items()}
     
@@ -98,7 +99,8 @@ class StaffDataWidget(BaseOptionsWidget):
         
         full_y_plot_points = []
         for index, day in enumerate(working_days):
-            y_plot_points = [cit.in_minutes() - attendance.period.time.in_minutes() for attendance in staff.attendance if BaseDataDisplayWidget.is_entry_countable(attendance, [day], timeline_dates) is not None]
+            countable = self.data.attendance_data.countable_mask([day], timeline_dates, staff)
+            y_plot_points = ((cit.in_seconds() - self.data.attendance_data.day_seconds[countable]) / 60).tolist()
             
             if y_plot_points:
                 full_y_plot_points.append([index, day, y_plot_points])
@@ -157,13 +159,15 @@ class StaffDataWidget(BaseOptionsWidget):
         else:
             r = g = b = 255
         
-        cins = [att.period.time.in_seconds() for att in staff.attendance if att.is_check_in]
-        avg_cit = Time(0, 0, sum(cins) / len(cins) if cins else 0)
+        staff_mask = self.data.attendance_data.staff_mask(staff)
+        
+        cins = self.data.attendance_data.day_seconds[staff_mask & self.data.attendance_data.check_in]
+        avg_cit = Time(0, 0, float(cins.mean()) if len(cins) else 0)
         avg_cit.normalize()
         avg_cit.sec = int(avg_cit.sec)
         
-        couts = [att.period.time.in_seconds() for att in staff.attendance if not att.is_check_in]
-        avg_cot = Time(0, 0, sum(couts) / len(couts) if couts else 0)
+        couts = self.data.attendance_data.day_seconds[staff_mask & ~self.data.attendance_data.check_in]
+        avg_cot = Time(0, 0, float(couts.mean()) if len(couts) else 0)
         avg_cot.normalize()
         avg_cot.sec = int(avg_cot.sec)
         
@@ -264,9 +268,9 @@ class StaffDataWidget(BaseOptionsWidget):
             self.staff_data_layout.addWidget(LabeledField("Duties", duties_widget))
 
 class CardScanScreenWidget(BaseOptionsWidget):
-    comm_signal = pySignal(str)
+    comm_signal = pySignal(str, str)
     
-    def __init__(self, data: AppData, comm_system: BaseCommSystem, parent_widget: TabViewWidget, saved_state_changed: pyBoundSignal):
+    def __init__(self, data: AppData, comm_system: ConnectionHub, parent_widget: TabViewWidget, saved_state_changed: pyBoundSignal):
         super().__init__(parent_widget, "static")
         self.data = data
         self.comm_system = comm_system
@@ -297,6 +301,7 @@ class CardScanScreenWidget(BaseOptionsWidget):
         self.comm_system.set_data_point("IUD", self.comm_signal)
         
         self.iud_label = None
+        self.scan_source: str | None = None
         
         self.comm_system.connection_changed_signal.connect(self.connection_changed)
         self.iud_changed = False
@@ -313,7 +318,7 @@ class CardScanScreenWidget(BaseOptionsWidget):
     def finished(self):
         self.iud_label = None
         if self.iud_changed:
-            self.comm_system.send_message("REGISTERED")
+            self.comm_system.send_message("REGISTERED", source=self.scan_source)
             
             # QTimer.singleShot(
             #     500,
@@ -328,40 +333,29 @@ class CardScanScreenWidget(BaseOptionsWidget):
         if not state and self.parent_widget.stack.indexOf(self) == self.parent_widget.stack.currentIndex():
             self.finished()
     
-    def scanned(self, data: str):
+    def scanned(self, data: str, source: str | None = None):
         if self.parent_widget.stack.currentIndex() == self.parent_widget.stack.indexOf(self):
-            for prefect in self.data.prefects.values():
-                if prefect.IUD == data:
-                    self.comm_system.send_message("UNREGISTERED")
-                    self.just_scanned = True
-                    
-                    QTimer.singleShot(1000, lambda: self.comm_system.send_message("Card has already_ been assigned "))
-                    
-                    QMessageBox.warning(self.parent_widget, "KeyError", f"Card of IUD {data} has already been assigned to the prefect {prefect.name.full()}")
-                    
-                    QTimer.singleShot(500, self._deactivate_just_scanned)
-                    self.iud_changed = False
-                    self.finished()
-                    return
-            else:
-                for teacher in self.data.teachers.values():
-                    if teacher.IUD == data:
-                        self.comm_system.send_message("UNREGISTERED")
-                        self.just_scanned = True
-                        
-                        QTimer.singleShot(1000, lambda: self.comm_system.send_message("Card has already_ been assigned "))
-                        
-                        QMessageBox.warning(self.parent_widget, "KeyError", f"Card of IUD {data} has already been assigned to the teacher {teacher.name.full()}")
-                        
-                        QTimer.singleShot(500, self._deactivate_just_scanned)
-                        self.iud_changed = False
-                        self.finished()
-                        return
+            self.scan_source = source
+            
+            holder = self.data.staff_by_iud(data)
+            
+            if holder is not None:
+                self.comm_system.send_message("UNREGISTERED", source=source)
+                self.just_scanned = True
+                
+                self.comm_system.send_message("Card has already_ been assigned ", delay=1, source=source)
+                
+                QMessageBox.warning(self.parent_widget, "KeyError", f"Card of IUD {data} has already been assigned to the {"prefect" if isinstance(holder, Prefect) else "teacher"} {holder.name.full()}")
+                
+                QTimer.singleShot(500, self._deactivate_just_scanned)
+                self.iud_changed = False
+                self.finished()
+                return
             
-            self.staff.IUD = data
+            self.data.set_iud(self.staff, data)
             self.iud_label.setText(self.staff.IUD)
             
-            self.saved_state_changed.emit(False)
+            self.saved_state_changed.emit(self.data.journaled())
             
             self.iud_changed = True
             self.finished()